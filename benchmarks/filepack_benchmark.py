@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+
+"""Compare the reference filepack implementations with their fast
+counterparts on the sample song in pylsdj's test data.
+
+Run from the repository root:
+
+    python benchmarks/filepack_benchmark.py
+"""
+
+import json
+import os
+import sys
+import timeit
+
+SCRIPT_DIR = os.path.abspath(os.path.dirname(__file__))
+
+sys.path.insert(0, os.path.join(SCRIPT_DIR, os.path.pardir))
+
+from pylsdj import filepack
+
+TEST_DATA_DIR = os.path.join(SCRIPT_DIR, os.path.pardir, "pylsdj", "test_data")
+
+ITERATIONS = 50
+
+
+def load_json(filename):
+    with open(os.path.join(TEST_DATA_DIR, filename), "r") as fp:
+        return json.load(fp)
+
+
+def best_time(fn, arg):
+    return min(timeit.repeat(lambda: fn(arg), number=ITERATIONS,
+                             repeat=5)) / ITERATIONS
+
+
+def compare(label, reference_fn, reference_arg, fast_fn, fast_arg):
+    assert list(reference_fn(reference_arg)) == list(fast_fn(fast_arg)), \
+        "%s: fast path output differs from the reference" % (label)
+
+    reference_time = best_time(reference_fn, reference_arg)
+    fast_time = best_time(fast_fn, fast_arg)
+
+    print("%-12s reference %8.3f ms   fast %8.3f ms   speedup %5.1fx" % (
+        label, reference_time * 1000, fast_time * 1000,
+        reference_time / fast_time))
+
+
+def main():
+    raw_data = load_json("sample_song_raw_data.json")
+    compressed_data = load_json("sample_song_compressed.json")
+
+    compare("compress", filepack.compress, raw_data,
+            filepack.compress_bytes, bytes(bytearray(raw_data)))
+    compare("decompress", filepack.decompress, compressed_data,
+            filepack.decompress_bytes, bytes(bytearray(compressed_data)))
+
+
+if __name__ == "__main__":
+    main()
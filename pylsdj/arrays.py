@@ -0,0 +1,171 @@
+"""NumPy arrays over a song's raw data, for working on whole tables at once.
+
+Tables made of whole bytes (phrase notes, chain phrases and so on) are
+presented as ``ndarray`` views of the song's raw data: no data is copied, and
+changes made through an array are made to the song. Tables of smaller fields
+(wave frames and the allocation tables) are unpacked into arrays with one
+element per field; changes to those are copied back into the song by
+:py:meth:`SongArrays.write_back`. Only the fields whose values were changed
+in the arrays are written back, so changes made to the same tables through
+the song in the meantime are kept.
+
+NumPy is an optional dependency; it's only imported when arrays are created.
+"""
+
+from . import layout
+
+# Tables of byte-sized fields, presented as views of the raw data
+BYTE_TABLES = (
+    'phrase_notes', 'phrase_fx', 'phrase_fx_val', 'phrase_instruments',
+    'chain_phrases', 'chain_transposes', 'song', 'grooves',
+    'table_envelopes', 'table_transposes', 'table_cmd1.fx', 'table_cmd1.val',
+    'table_cmd2.fx', 'table_cmd2.val', 'instr_alloc_table',
+    'table_alloc_table', 'bookmarks')
+
+# Tables of fields smaller than a byte, presented as unpacked copies
+PACKED_TABLES = (
+    'wave_frames', 'phrase_alloc_table', 'chain_alloc_table',
+    'wave_synth_overwrite_locks')
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("Song arrays require NumPy (install the 'numpy' "
+                          "package)")
+
+    return numpy
+
+
+def _byte_view(np, raw_data, field):
+    shape = field.shape
+    strides = tuple(stride // 8 for stride in field.strides)
+
+    if field.item_size > 8:
+        # A struct of bytes (such as a row of the song) gets a dimension of
+        # its own
+        shape += (field.item_size // 8,)
+        strides += (1,)
+
+    return np.ndarray(shape, dtype=np.uint8, buffer=raw_data,
+                      offset=field.offset // 8, strides=strides)
+
+
+def _count(field):
+    count = 1
+
+    for dimension in field.shape:
+        count *= dimension
+
+    return count
+
+
+def _shifts(np, field):
+    return np.arange(8 - field.item_size, -1, -field.item_size,
+                     dtype=np.uint8)
+
+
+def _unpack(np, raw_data, field):
+    # Every field in the packed tables is laid out contiguously, so the table
+    # is a run of bytes holding 8 / item_size fields each
+    start, stop = layout.byte_range(field)
+    packed = np.frombuffer(raw_data, dtype=np.uint8, count=stop - start,
+                           offset=start)
+
+    mask = (1 << field.item_size) - 1
+
+    return ((packed[:, np.newaxis] >> _shifts(np, field)) & mask).reshape(-1)
+
+
+class SongArrays(object):
+
+    """A set of NumPy arrays over a song's raw data, indexed by field name
+    (``arrays['phrase_notes']``). Nested fields have dotted names, as in
+    :py:mod:`pylsdj.layout`. Every array has dtype ``uint8`` and holds the
+    fields' raw values (note codes rather than note names, for example).
+
+    The song's rows (``arrays['song']``) have a last dimension of size 4,
+    holding the pulse 1, pulse 2, wave and noise chains.
+
+    Can be used as a context manager, in which case the unpacked tables are
+    written back when the block exits without an error.
+    """
+
+    def __init__(self, raw_data):
+        """Constructor.
+
+        :param raw_data: the song's raw data, as a ``bytearray``
+        """
+        np = _numpy()
+
+        self._raw_data = raw_data
+        self._arrays = {}
+
+        # The packed tables' values as of the last write-back, for finding
+        # which fields were changed in the arrays
+        self._written = {}
+
+        for name in BYTE_TABLES:
+            self._arrays[name] = _byte_view(
+                np, raw_data, layout.SONG_LAYOUT[name])
+
+        for name in PACKED_TABLES:
+            field = layout.SONG_LAYOUT[name]
+            self._arrays[name] = _unpack(np, raw_data, field)[
+                :_count(field)].reshape(field.shape)
+            self._written[name] = self._arrays[name].copy()
+
+    def __getitem__(self, name):
+        return self._arrays[name]
+
+    def __contains__(self, name):
+        return name in self._arrays
+
+    def keys(self):
+        return sorted(self._arrays.keys())
+
+    def write_back(self):
+        """Copy the unpacked tables' changed values back into the song's raw
+        data. Fields whose values haven't been changed in the arrays since
+        they were created (or last written back) are left as they are in the
+        song. The byte tables are views of the raw data, so they never need
+        to be written back.
+
+        :raises ValueError: if a value is too large to fit in its field
+        """
+        np = _numpy()
+
+        for name in PACKED_TABLES:
+            field = layout.SONG_LAYOUT[name]
+            values = self._arrays[name].reshape(-1)
+
+            if values.max() >> field.item_size:
+                raise ValueError("%s holds a value too large for its %d-bit "
+                                 "fields" % (name, field.item_size))
+
+            changed = np.flatnonzero(values != self._written[name].reshape(-1))
+
+            if changed.size == 0:
+                continue
+
+            # Start from the table's current contents, so that fields that
+            # weren't changed in the array (and any bits in its last byte
+            # that belong to something else) are kept
+            unpacked = _unpack(np, self._raw_data, field)
+            unpacked[changed] = values[changed]
+
+            packed = (unpacked.reshape(-1, 8 // field.item_size) <<
+                      _shifts(np, field)).sum(axis=1, dtype=np.uint8)
+
+            start, stop = layout.byte_range(field)
+            self._raw_data[start:stop] = packed.tobytes()
+
+            self._written[name] = self._arrays[name].copy()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, t, value, traceback):
+        if t is None:
+            self.write_back()
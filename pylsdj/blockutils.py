@@ -1,4 +1,7 @@
+import os
+
 from . import filepack
+from .vendor import six
 
 """LSDJ stores its data in a block-oriented format. This file contains a Block
 object that encapsulates a block's data, and
@@ -7,9 +10,14 @@ object that encapsulates a block's data, and
 # Maximum size of a block - 512 bytes
 BLOCK_SIZE = 0x200
 
+# The number of blocks in a .sav file, including the header block
+MAX_BLOCKS = 0xc0
+
 
 class Block(object):
 
+    __slots__ = ('id', 'data')
+
     def __init__(self, block_id, data):
         self.id = block_id
         self.data = data
@@ -31,17 +39,148 @@ class Block(object):
         return repr_str
 
 
+def read_blocks(fp, block_ids, start_offset=0):
+    """Read blocks from an open file.
+
+    :param fp: the file from which to read blocks
+    :param block_ids: the IDs of the blocks to read
+    :param start_offset: the offset in the file of block 0
+    :rtype: a map from block ID to block
+    """
+    blocks = {}
+
+    for block_id in sorted(block_ids):
+        fp.seek(start_offset + block_id * BLOCK_SIZE, os.SEEK_SET)
+        blocks[block_id] = Block(block_id, bytearray(fp.read(BLOCK_SIZE)))
+
+    return blocks
+
+
+class BlockBufferMap(object):
+
+    """A read-only map from block IDs to blocks that copies each block out of
+    a buffer holding a whole file (such as a memoryview of a memory-mapped
+    file) when it's requested, so that only the blocks that are needed are
+    read.
+
+    Blocks' data are copies, so the map is the only thing referring to the
+    buffer; :py:meth:`detach` makes the map stop referring to it.
+    """
+
+    def __init__(self, buf, block_ids, start_offset=0):
+        """Constructor.
+
+        :param buf: a memoryview of the file's contents (or, on Python 2,
+          where memoryviews of mmaps can't be made, the mmap itself)
+        :param block_ids: the IDs of the blocks in the map
+        :param start_offset: the offset in the buffer of block 0
+        """
+        self._buf = buf
+        self._block_ids = list(block_ids)
+        self._start_offset = start_offset
+
+        # The map's blocks' data, once the map has been detached from buf
+        self._block_data = None
+
+    def keys(self):
+        return list(self._block_ids)
+
+    def __contains__(self, block_id):
+        return block_id in self._block_ids
+
+    def __len__(self):
+        return len(self._block_ids)
+
+    def _read(self, block_id):
+        start = self._start_offset + block_id * BLOCK_SIZE
+        data = self._buf[start:start + BLOCK_SIZE]
+
+        # bytes() of a memoryview is its repr on Python 2
+        if isinstance(data, memoryview):
+            return data.tobytes()
+
+        return bytes(data)
+
+    def __getitem__(self, block_id):
+        if block_id not in self._block_ids:
+            raise KeyError(block_id)
+
+        if self._block_data is not None:
+            return Block(block_id, self._block_data[block_id])
+
+        return Block(block_id, self._read(block_id))
+
+    def detach(self):
+        """Copy every block out of the buffer and stop referring to it, so
+        that the buffer can be released. The map keeps working afterwards."""
+        if self._block_data is not None:
+            return
+
+        self._block_data = dict((block_id, self._read(block_id))
+                                for block_id in self._block_ids)
+        self._buf = None
+
+
 class BlockFactory(object):
 
     """Each block's ID should correspond to its position in an array of blocks.
+
+    The factory's blocks are all views into one buffer, with block ``n`` at
+    offset ``n * BLOCK_SIZE``, so writing to a block's data writes straight
+    into the buffer. New blocks' data are zeroed.
+
+    On Python 2, where indexing a memoryview gives strings rather than ints,
+    each block has its own ``bytearray`` instead, and the blocks are copied
+    into the buffer when :py:attr:`buffer` is read.
     """
 
-    def __init__(self):
+    def __init__(self, max_blocks=MAX_BLOCKS, buf=None, start_offset=0):
+        """Constructor.
+
+        :param max_blocks: the maximum number of blocks that the factory can
+          create
+        :param buf: the ``bytearray`` that holds the blocks' data; if None, a
+          new buffer just large enough for ``max_blocks`` blocks is created
+        :param start_offset: the offset in ``buf`` of block 0
+        """
+        if buf is None:
+            buf = bytearray(max_blocks * BLOCK_SIZE)
+
+        if start_offset + max_blocks * BLOCK_SIZE > len(buf):
+            raise ValueError("A buffer of %d bytes can't hold %d blocks "
+                             "starting at offset 0x%x" %
+                             (len(buf), max_blocks, start_offset))
+
         self.max_id = 0
+        self.max_blocks = max_blocks
         self.blocks = {}
 
+        self._buf = buf
+        self._view = memoryview(buf)
+        self._start_offset = start_offset
+
+    @property
+    def buffer(self):
+        """the ``bytearray`` holding the blocks' data"""
+        if six.PY2:
+            for block_id, block in self.blocks.items():
+                start = self._start_offset + block_id * BLOCK_SIZE
+                self._buf[start:start + len(block.data)] = block.data
+
+        return self._buf
+
     def new_block(self):
-        block = Block(self.max_id, [])
+        assert self.max_id < self.max_blocks, \
+            "Ran out of blocks (can only create %d)" % (self.max_blocks)
+
+        start = self._start_offset + self.max_id * BLOCK_SIZE
+        self._buf[start:start + BLOCK_SIZE] = b'\0' * BLOCK_SIZE
+
+        if six.PY2:
+            block = Block(self.max_id, bytearray(BLOCK_SIZE))
+        else:
+            block = Block(self.max_id, self._view[start:start + BLOCK_SIZE])
+
         self.blocks[self.max_id] = block
         self.max_id += 1
 
@@ -56,6 +195,27 @@ class BlockWriter(object):
         return filepack.split(compressed_data, BLOCK_SIZE,
                               factory)
 
+    def copy(self, blocks, factory):
+        """Copies a chain of already-compressed blocks into new blocks,
+        renumbering their block switches to match the new blocks' IDs.
+
+        :param blocks: the blocks to copy, in the order in which their data is
+          read
+        :param factory: a BlockFactory used to construct the new blocks
+
+        :rtype: a list of the new blocks' IDs
+        """
+        new_blocks = [factory.new_block() for block in blocks]
+        block_ids = [block.id for block in new_blocks]
+
+        renumbered = filepack.renumber_block_switches(
+            [block.data for block in blocks], block_ids)
+
+        for block, data in zip(new_blocks, renumbered):
+            block.data[:len(data)] = data
+
+        return block_ids
+
 
 class BlockReader(object):
 
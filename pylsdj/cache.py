@@ -0,0 +1,178 @@
+"""A cache of decompressed songs, keyed by the songs' compressed data.
+
+The same song often turns up in many files (for example, in every backup of a
+.sav file). A :py:class:`ProjectCache` lets projects loaded from any of those
+files share the work of decompressing it. Entries are kept in memory, up to a
+fixed number of them, and evicted least-recently-used first; if the cache is
+given a directory, entries are also stored there so that they outlive the
+process. The directory is unbounded unless the cache is also given a maximum
+number of entries to store there, in which case the least-recently-used
+stored entries are removed as new ones are added.
+"""
+
+import collections
+import hashlib
+import os
+
+from . import filepack
+from . import utils
+from .consts import RAW_DATA_SIZE
+
+# The extension of the files in which entries are stored
+_ENTRY_EXTENSION = '.raw'
+
+
+def _is_song(raw_data):
+    # Anything else is a partially-written file, or wasn't a song to begin
+    # with, and isn't cached
+    return len(raw_data) == RAW_DATA_SIZE
+
+
+class ProjectCache(object):
+
+    def __init__(self, max_entries=128, directory=None,
+                 max_stored_entries=None):
+        """Constructor.
+
+        :param max_entries: the maximum number of songs to keep in memory
+        :param directory: if provided, a directory in which to store songs
+          as well
+        :param max_stored_entries: if provided, the maximum number of songs to
+          store in ``directory``; if not, the directory grows without bound
+        """
+        if max_entries < 1 or (max_stored_entries is not None and
+                               max_stored_entries < 1):
+            raise ValueError("A cache must be able to hold at least one entry")
+
+        self.max_entries = max_entries
+        self.directory = directory
+        self.max_stored_entries = max_stored_entries
+
+        self.hits = 0
+        """the number of lookups that found a song"""
+
+        self.misses = 0
+        """the number of lookups that didn't find a song"""
+
+        self._entries = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def key(self, blocks):
+        """Compute the key for a song from the blocks that hold it.
+
+        :param blocks: a map from block ID to the blocks holding the song's
+          compressed data
+        :rtype: a string
+        """
+        return hashlib.sha1(bytes(filepack.compressed_stream(blocks))) \
+            .hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + _ENTRY_EXTENSION)
+
+    def get(self, key):
+        """Look up a song's raw data.
+
+        :param key: the song's key
+        :rtype: a copy of the song's raw (decompressed) data as a bytearray,
+          or None if the song isn't in the cache
+        """
+        raw_data = self._entries.pop(key, None)
+
+        if raw_data is None and self.directory is not None:
+            try:
+                with open(self._path(key), 'rb') as fp:
+                    raw_data = fp.read()
+
+                # Stored entries are evicted least-recently-used first, by
+                # modification time
+                os.utime(self._path(key), None)
+            except (IOError, OSError):
+                pass
+
+            if raw_data is not None and not _is_song(raw_data):
+                raw_data = None
+
+        if raw_data is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._remember(key, raw_data)
+
+        # Projects change their raw data in place, so they mustn't be given
+        # the cached copy
+        return bytearray(raw_data)
+
+    def put(self, key, raw_data):
+        """Add a song's raw data to the cache.
+
+        :param key: the song's key
+        :param raw_data: the song's raw (decompressed) data
+        """
+        raw_data = bytes(raw_data)
+
+        if not _is_song(raw_data):
+            return
+
+        self._entries.pop(key, None)
+        self._remember(key, raw_data)
+
+        if self.directory is not None and not os.path.exists(self._path(key)):
+            # Write under a temporary name and rename into place, so that
+            # other processes sharing the directory never see a partial entry
+            with utils.atomic_file(self._path(key)) as fp:
+                fp.write(raw_data)
+
+            self._evict_stored()
+
+    def _remember(self, key, raw_data):
+        self._entries[key] = raw_data
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _evict_stored(self):
+        if self.max_stored_entries is None:
+            return
+
+        stored = []
+
+        for filename in os.listdir(self.directory):
+            if not filename.endswith(_ENTRY_EXTENSION):
+                continue
+
+            path = os.path.join(self.directory, filename)
+
+            try:
+                stored.append((os.path.getmtime(path), path))
+            except OSError:
+                # Removed by another process in the meantime
+                pass
+
+        stored.sort()
+
+        for mtime, path in stored[:len(stored) - self.max_stored_entries]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def decompress(self, blocks):
+        """Decompress a song, using the cache if possible.
+
+        :param blocks: a map from block ID to the blocks holding the song's
+          compressed data
+        :rtype: the song's raw data as a bytearray
+        """
+        key = self.key(blocks)
+
+        raw_data = self.get(key)
+
+        if raw_data is None:
+            raw_data = filepack.decompress_blocks(blocks)
+            self.put(key, raw_data)
+
+        return raw_data
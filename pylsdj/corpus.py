@@ -0,0 +1,170 @@
+"""Load every project in a directory tree of .sav, .lsdsng and .srm files.
+
+Files are loaded (and their songs decompressed) in a pool of worker processes,
+a limited number at a time, and their projects are yielded in the order in
+which the files are found. A file that can't be loaded doesn't stop the rest
+of the batch; its error is yielded in its place, or collected separately if
+the caller asks for that instead.
+"""
+
+import collections
+import multiprocessing
+import os
+
+from .project import load_lsdsng, load_srm
+from .savfile import SAVFile
+from .utils import process_pool
+
+# The number of files that may be loading or loaded but not yet consumed, per
+# worker, when loading files in a pool
+PENDING_FILES_PER_WORKER = 2
+
+
+def _load_sav(path):
+    sav = SAVFile(path)
+    sav.load_all()
+
+    return [(file_number, project)
+            for file_number, project in sav.project_list
+            if project is not None]
+
+
+def _load_lsdsng(path):
+    return [(None, load_lsdsng(path))]
+
+
+def _load_srm(path):
+    return [(None, load_srm(path))]
+
+
+# Loaders for each supported file extension
+LOADERS = {
+    '.sav': _load_sav,
+    '.lsdsng': _load_lsdsng,
+    '.srm': _load_srm
+}
+
+
+def _loader(path):
+    return LOADERS.get(os.path.splitext(path)[1].lower())
+
+
+def _load_file(path):
+    # Runs in worker processes; decompresses each project's song before it's
+    # sent back, so that the work is done in the worker
+    projects = _loader(path)(path)
+
+    for file_number, project in projects:
+        project._raw_bytes
+
+    return projects
+
+
+def find_files(root):
+    """Find the files that can be loaded in a directory tree.
+
+    :param root: the directory to search, or a single file
+    :rtype: a generator of paths to files with supported extensions, in
+      sorted order within each directory
+    """
+    if not os.path.isdir(root):
+        if _loader(root) is not None:
+            yield root
+        return
+
+    for dirpath, dirnames, filenames in os.walk(root):
+        # Walk in a predictable order
+        dirnames.sort()
+
+        for filename in sorted(filenames):
+            path = os.path.join(dirpath, filename)
+
+            if _loader(path) is not None:
+                yield path
+
+
+def load_corpus(root, workers=None, executor=None, errors=None,
+                max_pending=None):
+    """Load every project in a directory tree.
+
+    :param root: the directory to search, or a single file
+    :param workers: if provided, load files in a new pool of this many worker
+      processes
+    :param executor: a ``concurrent.futures.Executor`` in which to load files;
+      if neither ``workers`` nor ``executor`` is provided, files are loaded
+      one at a time in this process
+    :param errors: if provided, a list to which a ``(path, exception)`` tuple
+      is appended for each file that couldn't be loaded, instead of yielding
+      an error record for it
+    :param max_pending: the maximum number of files that may be loading (or
+      loaded but not yet yielded) at once, which bounds memory use; defaults
+      to a small multiple of the number of workers
+
+    :rtype: a generator of ``(path, file_number, project)`` tuples, where
+      ``file_number`` is the project's file number within a .sav file, or
+      None for projects loaded from .lsdsng and .srm files. Unless ``errors``
+      is provided, each file that couldn't be loaded gets a
+      ``(path, None, exception)`` record instead, where ``exception`` is the
+      error that loading it raised.
+    """
+    if executor is None and workers is not None:
+        with process_pool(workers) as pool:
+            if max_pending is None:
+                max_pending = workers * PENDING_FILES_PER_WORKER
+
+            for record in load_corpus(root, executor=pool, errors=errors,
+                                      max_pending=max_pending):
+                yield record
+
+        return
+
+    if executor is None:
+        for path in find_files(root):
+            try:
+                projects = _load_file(path)
+            except Exception as e:
+                if errors is None:
+                    yield (path, None, e)
+                else:
+                    errors.append((path, e))
+
+                continue
+
+            for file_number, project in projects:
+                yield (path, file_number, project)
+
+        return
+
+    if max_pending is None:
+        max_pending = multiprocessing.cpu_count() * PENDING_FILES_PER_WORKER
+
+    pending = collections.deque()
+    paths = find_files(root)
+
+    while True:
+        # Keep the pool busy, but don't get too far ahead of the consumer
+        while len(pending) < max_pending:
+            path = next(paths, None)
+
+            if path is None:
+                break
+
+            pending.append((path, executor.submit(_load_file, path)))
+
+        if len(pending) == 0:
+            return
+
+        path, future = pending.popleft()
+
+        try:
+            projects = future.result()
+        except Exception as e:
+            if errors is None:
+                yield (path, None, e)
+            else:
+                errors.append((path, e))
+
+            continue
+
+        for file_number, project in projects:
+            yield (path, file_number, project)
@@ -1,5 +1,6 @@
-import itertools
+import re
 
+from .consts import RAW_DATA_SIZE
 from .vendor.six.moves import range
 
 # Byte used to denote run-length encoding
@@ -42,6 +43,48 @@ STATE_DEFAULT_INSTR = 4
 STATE_DEFAULT_WAVE = 5
 STATE_DONE = 6
 
+# Compression modes. Greedy compression makes the same local decisions that
+# LSDJ does; optimal compression searches for the smallest encoding.
+COMPRESS_GREEDY = "greedy"
+COMPRESS_OPTIMAL = "optimal"
+
+COMPRESS_MODES = [COMPRESS_GREEDY, COMPRESS_OPTIMAL]
+
+# An escape that expands to raw data: an escaped RLE or special byte, an RLE
+# run, or a run of default waves or instruments
+_ESCAPE = b'\xc0\xc0|\xc0..|\xe0\xe0|\xe0[\xf0\xf1].'
+
+_ESCAPE_RE = re.compile(_ESCAPE, re.DOTALL)
+
+# A sequence of literal bytes and escapes; a match stops at the first block
+# switch or EOF command
+_DATA_RE = re.compile(b'(?:[^\xc0\xe0]|' + _ESCAPE + b')*', re.DOTALL)
+
+# A single literal byte or escape
+_TOKEN_RE = re.compile(b'[^\xc0\xe0]|' + _ESCAPE, re.DOTALL)
+
+# Up to 64 consecutive literal bytes and escapes, for decoding a stream a
+# little at a time
+_DATA_CHUNK_RE = re.compile(
+    b'(?:[^\xc0\xe0]|' + _ESCAPE + b'){1,64}', re.DOTALL)
+
+# The longest run of each byte value that a single RLE command can encode
+_RUNS = [bytes(bytearray([value]) * 0xff) for value in range(0x100)]
+
+# The longest runs of default waves and instruments that a single default
+# command can encode
+_DEFAULT_WAVES = bytes(DEFAULT_WAVE * 0xff)
+_DEFAULT_INSTRUMENTS = bytes(DEFAULT_INSTRUMENT_FILEPACK * 0xff)
+
+# The tokens that the compressor emits for anything other than a literal, in
+# the order in which it prefers them: a reserved byte that must be escaped, a
+# run of default instruments, a run of default waves, or a run of at least four
+# identical bytes. Each run is limited to what its count byte can hold.
+_ENCODE_RE = re.compile(
+    b'([\xc0\xe0])|((?:' + re.escape(bytes(DEFAULT_INSTRUMENT_FILEPACK)) +
+    b'){1,255})|((?:' + re.escape(bytes(DEFAULT_WAVE)) + b'){1,255})|'
+    b'((.)\\5{3,254})', re.DOTALL)
+
 
 def split(compressed_data, segment_size, block_factory):
     """Splits compressed data into blocks.
@@ -54,88 +97,100 @@ def split(compressed_data, segment_size, block_factory):
     splitting
     """
 
-    # Split compressed data into blocks
-    segments = []
+    if not isinstance(compressed_data, (bytes, bytearray)):
+        compressed_data = bytearray(compressed_data)
 
-    current_segment_start = 0
-    index = 0
-    data_size = len(compressed_data)
+    segment_ends = _segment_ends(compressed_data, segment_size)
 
-    while index < data_size:
-        current_byte = compressed_data[index]
+    block_ids = []
+
+    for segment_end in segment_ends:
+        block = block_factory.new_block()
+        block_ids.append(block.id)
+
+    data = memoryview(compressed_data)
+    segment_start = 0
+
+    for (i, segment_end) in enumerate(segment_ends):
+        block = block_factory.blocks[block_ids[i]]
 
-        if index < data_size - 1:
-            next_byte = compressed_data[index + 1]
+        if i == len(segment_ends) - 1:
+            # End the segment with an EOF
+            command = [SPECIAL_BYTE, EOF_BYTE]
         else:
-            next_byte = None
+            # End the segment with a pointer to the next segment
+            command = [SPECIAL_BYTE, block_ids[i + 1]]
 
-        jump_size = 1
+        if len(block.data) > segment_size:
+            block.data = block.data[:segment_size]
 
-        if current_byte == RLE_BYTE:
-            assert next_byte is not None, "Expected a command to follow " \
-                "RLE byte"
-            if next_byte == RLE_BYTE:
-                jump_size = 2
-            else:
-                jump_size = 3
+        # New blocks are already zeroed, so the segment and its command are
+        # all that need to be written
+        segment_length = segment_end - segment_start
 
-        elif current_byte == SPECIAL_BYTE:
-            assert next_byte is not None, "Expected a command to follow " \
-                "special byte"
-
-            if next_byte == SPECIAL_BYTE:
-                jump_size = 2
-            elif next_byte == DEFAULT_INSTR_BYTE or \
-                    next_byte == DEFAULT_WAVE_BYTE:
-                jump_size = 3
-            else:
-                assert False, "Encountered unexpected EOF or block " \
-                    "switch while segmenting"
+        block.data[:segment_length] = data[segment_start:segment_end]
+        block.data[segment_length:segment_length + 2] = bytearray(command)
 
-        # Need two bytes for the jump or EOF
-        if index - current_segment_start + jump_size > segment_size - 2:
-            segments.append(compressed_data[
-                current_segment_start:index])
+        segment_start = segment_end
 
-            current_segment_start = index
-        else:
-            index += jump_size
+    return block_ids
 
-    # Append the last segment, if any
-    if current_segment_start != index:
-        segments.append(compressed_data[
-            current_segment_start:current_segment_start + index])
 
-    # Make sure that no data was lost while segmenting
-    total_segment_length = sum(map(len, segments))
-    assert total_segment_length == len(compressed_data), "Lost %d bytes of " \
-        "data while segmenting" % (len(compressed_data) - total_segment_length)
+def _segment_ends(compressed_data, segment_size):
+    """Find where each segment of compressed data ends when it's split into
+    blocks.
 
-    block_ids = []
+    Each segment holds as many whole tokens (literals and escapes) as fit in a
+    block, leaving two bytes for the block switch or EOF that ends it. The
+    regular expression engine finds the last token that fits, so the data is
+    never walked a byte at a time in Python.
 
-    for segment in segments:
-        block = block_factory.new_block()
-        block_ids.append(block.id)
+    :rtype: a list of the offsets at which the segments end
+    """
+    # Need two bytes for the jump or EOF
+    max_segment_length = segment_size - 2
 
-    for (i, segment) in enumerate(segments):
-        block = block_factory.blocks[block_ids[i]]
+    data_size = len(compressed_data)
+    segment_ends = []
+    segment_start = 0
 
-        assert len(block.data) == 0, "Encountered a block with "
-        "pre-existing data while writing"
+    while segment_start < data_size:
+        window_end = min(segment_start + max_segment_length, data_size)
 
-        if i == len(segments) - 1:
-            # Write EOF to the end of the segment
-            add_eof(segment)
-        else:
-            # Write a pointer to the next segment
-            add_block_switch(segment, block_ids[i + 1])
+        segment_end = _DATA_RE.match(
+            compressed_data, segment_start, window_end).end()
 
-        # Pad segment with zeroes until it's large enough
-        pad(segment, segment_size)
+        if (segment_end < window_end and
+                not _TOKEN_RE.match(compressed_data, segment_end)):
+            # The segment didn't stop because the next token doesn't fit, but
+            # because there isn't a valid token there
+            _check_token(compressed_data, segment_end)
 
-        block.data = segment
+        assert segment_end > segment_start, "Segments of %d bytes are too " \
+            "small to hold any data" % (segment_size)
 
-    return block_ids
+        segment_ends.append(segment_end)
+        segment_start = segment_end
+
+    return segment_ends
+
+
+def _check_token(compressed_data, index):
+    """Fail with an explanation of why there isn't a valid token at an offset
+    in compressed data."""
+    current_byte = compressed_data[index]
+
+    if index < len(compressed_data) - 1:
+        next_byte = compressed_data[index + 1]
+    else:
+        next_byte = None
+
+    if current_byte == RLE_BYTE:
+        assert next_byte is not None, "Expected a command to follow RLE byte"
+        assert False, "RLE command truncated at end of data"
+
+    assert next_byte is not None, "Expected a command to follow special byte"
+    assert False, "Encountered unexpected EOF or block switch while segmenting"
 
 
 def renumber_block_keys(blocks):
@@ -153,29 +208,10 @@ def renumber_block_keys(blocks):
 
     # Scan the blocks, recording every block switch statement
     for block in list(blocks.values()):
-        i = 0
-        while i < len(block.data) - 1:
-            current_byte = block.data[i]
-            next_byte = block.data[i + 1]
-
-            if current_byte == RLE_BYTE:
-                if next_byte == RLE_BYTE:
-                    i += 2
-                else:
-                    i += 3
-            elif current_byte == SPECIAL_BYTE:
-                if next_byte in SPECIAL_DEFAULTS:
-                    i += 3
-                elif next_byte == SPECIAL_BYTE:
-                    i += 2
-                else:
-                    if next_byte != EOF_BYTE:
-                        byte_switch_keys.append(next_byte)
-
-                    break
+        command = _find_command(block.data)[1]
 
-            else:
-                i += 1
+        if command is not None and command != EOF_BYTE:
+            byte_switch_keys.append(command)
 
     byte_switch_keys.sort()
     block_keys.sort()
@@ -201,6 +237,84 @@ def renumber_block_keys(blocks):
     return new_block_map
 
 
+def block_chain(blocks):
+    """List a block map's blocks in the order in which their data is read,
+    starting with the lowest-numbered block and following block switches
+    until EOF.
+
+    :param blocks: a block map
+    :rtype: a list of blocks
+    """
+    chain = []
+
+    block = blocks[min(blocks.keys())]
+
+    while True:
+        chain.append(block)
+
+        command = _find_command(block.data)[1]
+
+        assert command is not None, "Ran off the end of a block without " \
+            "encountering a block switch or EOF"
+
+        if command == EOF_BYTE:
+            return chain
+
+        assert len(chain) < len(blocks), "Block switches form a cycle; " \
+            "possible corruption"
+
+        block = blocks[command]
+
+
+def compressed_stream(blocks):
+    """The compressed data held by a chain of blocks, without the block
+    switches that link the blocks or the EOF that ends them. Two chains of
+    blocks hold the same song if and only if their streams are equal,
+    regardless of which block numbers they occupy.
+
+    :param blocks: a block map
+    :rtype: a bytearray
+    """
+    stream = bytearray()
+
+    for block in block_chain(blocks):
+        offset = _find_command(block.data)[0]
+        stream.extend(block.data[:offset])
+
+    return stream
+
+
+def renumber_block_switches(blocks, block_ids):
+    """Rewrite the block switch statements in a chain of blocks so that each
+    block switches to a new block ID.
+
+    :param blocks: the blocks' data, in the order in which it's read
+    :param block_ids: the new IDs of the blocks, in the same order
+
+    :rtype: a list of copies of the blocks' data, with the block switch
+      statements renumbered
+    """
+    assert len(blocks) == len(block_ids)
+
+    renumbered = []
+
+    for i, data in enumerate(blocks):
+        data = bytearray(data)
+        offset, command = _find_command(data)
+
+        if i == len(blocks) - 1:
+            assert command == EOF_BYTE, "Last block doesn't end with EOF"
+        else:
+            assert command is not None and command != EOF_BYTE, \
+                "Block %d doesn't end with a block switch" % (i)
+
+            data[offset + 1] = block_ids[i + 1]
+
+        renumbered.append(data)
+
+    return renumbered
+
+
 def merge(blocks):
     """Merge the given blocks into a contiguous block of compressed data.
 
@@ -214,36 +328,15 @@ def merge(blocks):
     eof = False
 
     while not eof:
-        data_size_to_append = None
         next_block = None
 
-        i = 0
-        while i < len(current_block.data) - 1:
-            current_byte = current_block.data[i]
-            next_byte = current_block.data[i + 1]
-
-            if current_byte == RLE_BYTE:
-                if next_byte == RLE_BYTE:
-                    i += 2
-                else:
-                    i += 3
-            elif current_byte == SPECIAL_BYTE:
-                if next_byte in SPECIAL_DEFAULTS:
-                    i += 3
-                elif next_byte == SPECIAL_BYTE:
-                    i += 2
-                else:
-                    data_size_to_append = i
-
-                    # hit end of file
-                    if next_byte == EOF_BYTE:
-                        eof = True
-                    else:
-                        next_block = blocks[next_byte]
-
-                    break
-            else:
-                i += 1
+        data_size_to_append, next_byte = _find_command(current_block.data)
+
+        if next_byte == EOF_BYTE:
+            # hit end of file
+            eof = True
+        elif next_byte is not None:
+            next_block = blocks[next_byte]
 
         assert data_size_to_append is not None, "Ran off the end of a "\
             "block without encountering a block switch or EOF"
@@ -259,30 +352,27 @@ def merge(blocks):
     return compressed_data
 
 
-def add_eof(segment):
-    """Add an EOF statement to a block."""
-    segment.extend([SPECIAL_BYTE, EOF_BYTE])
-
+def _find_command(data):
+    """Find the block switch or EOF command that ends a block's data.
 
-def add_block_switch(segment, block_id):
-    """Add a block switch statement to a block.
+    :param data: the block's data
 
-    :param segment: the segment to which to add the statement
-    :param block_id: the block ID to which the switch statement should switch
+    :rtype: a ``(offset, command)`` tuple, where ``offset`` is the offset of
+      the command's special byte and ``command`` is the block number to switch
+      to or ``EOF_BYTE``; ``(None, None)`` if the block has no such command
     """
-    segment.extend([SPECIAL_BYTE, block_id])
+    if not isinstance(data, (bytes, bytearray)):
+        data = bytearray(data)
 
+    offset = _DATA_RE.match(data).end()
 
-def pad(segment, size):
-    """Add zeroes to a segment until it reaches a certain size.
+    # A bytearray, so that the command's bytes are ints on Python 2 too
+    command = bytearray(data[offset:offset + 2])
 
-    :param segment: the segment to pad
-    :param size: the size to which to pad the segment
-    """
-    for i in range(size - len(segment)):
-        segment.append(0)
+    if len(command) == 2 and command[0] == SPECIAL_BYTE:
+        return (offset, command[1])
 
-    assert len(segment) == size
+    return (None, None)
 
 
 def decompress(compressed_data):
@@ -338,13 +428,208 @@ def decompress(compressed_data):
     return raw_data
 
 
-def compress(raw_data):
+def _put(out, out_pos, chunk):
+    """Write a chunk of bytes into an output buffer at the given position,
+    growing the buffer if the chunk runs past its end.
+
+    :rtype: the position just past the written chunk
+    """
+    end_pos = out_pos + len(chunk)
+
+    if end_pos <= len(out):
+        out[out_pos:end_pos] = chunk
+    else:
+        del out[out_pos:]
+        out += chunk
+
+    return end_pos
+
+
+def _expand(match):
+    """Expand a single escape matched by ``_ESCAPE_RE`` into raw bytes."""
+    # Index a bytearray so that the escape's bytes are ints on Python 2 too,
+    # and always return bytes, which is what re.sub wants there
+    token = bytearray(match.group())
+
+    if len(token) == 2:
+        # Escaped RLE or special byte
+        return _RUNS[token[0]][:1]
+    elif token[0] == RLE_BYTE:
+        return _RUNS[token[1]][:token[2]]
+    elif token[1] == DEFAULT_WAVE_BYTE:
+        return _DEFAULT_WAVES[:len(DEFAULT_WAVE) * token[2]]
+    else:
+        return _DEFAULT_INSTRUMENTS[
+            :len(DEFAULT_INSTRUMENT_FILEPACK) * token[2]]
+
+
+def _decode(data):
+    """Decode filepack tokens from the start of ``data``.
+
+    Tokenizing and the copying of literal runs between escapes are done by
+    the regular expression engine. Decoding stops at the end of the data or
+    at the first special command that isn't a default or an escaped special
+    byte (a block switch or EOF).
+
+    :rtype: a ``(raw_data, command)`` tuple, where ``raw_data`` is a
+      bytearray of the decoded bytes and ``command`` is the block switch or
+      EOF byte that stopped decoding, or None if decoding ran to the end of
+      the data
+    """
+    end = len(data)
+    stop = _DATA_RE.match(data).end()
+
+    # re.sub builds the decoded bytes in one piece, which is faster than
+    # copying each escape's expansion into a preallocated buffer
+    raw_data = bytearray(_ESCAPE_RE.sub(_expand, data[:stop]))
+
+    if stop == end:
+        return (raw_data, None)
+
+    # A bytearray, so that the command's bytes are ints on Python 2 too
+    command = bytearray(data[stop:min(stop + 2, end)])
+
+    assert len(command) == 2 and command[0] == SPECIAL_BYTE, (
+        "Encountered a truncated command at offset %d" % (stop))
+
+    return (raw_data, command[1])
+
+
+def decompress_bytes(compressed_data):
+    """Decompress data that has been compressed by the filepack algorithm.
+
+    This is a faster equivalent of :py:func:`decompress` that works on
+    ``bytes``, ``bytearray`` or ``memoryview`` input.
+
+    :param compressed_data: the compressed data to decompress
+
+    :rtype: a bytearray of decompressed bytes"""
+    if not isinstance(compressed_data, (bytes, bytearray)):
+        compressed_data = bytearray(compressed_data)
+
+    raw_data, command = _decode(compressed_data)
+
+    if command == EOF_BYTE:
+        assert False, ("Unexpected EOF command encountered while "
+                       "decompressing")
+    elif command is not None:
+        assert False, "Countered unexpected sequence 0x%02x 0x%02x" % (
+            SPECIAL_BYTE, command)
+
+    return raw_data
+
+
+def decompress_range(compressed_data, start, stop):
+    """Decompress only as much of a compressed stream as is needed to produce
+    the raw bytes in the range ``[start, stop)``.
+
+    :param compressed_data: the compressed data to decompress
+    :param start: the offset of the first raw byte to return
+    :param stop: the offset just past the last raw byte to return
+
+    :rtype: a bytearray holding the raw bytes in the range; shorter than
+      requested if the stream ends before ``stop``
+    """
+    if not isinstance(compressed_data, (bytes, bytearray)):
+        compressed_data = bytearray(compressed_data)
+
+    raw_data = bytearray(stop)
+    raw_size = 0
+
+    pos = 0
+    end = len(compressed_data)
+
+    while raw_size < stop and pos < end:
+        match = _DATA_CHUNK_RE.match(compressed_data, pos, end)
+
+        assert match is not None, "Encountered a block switch, EOF or " \
+            "truncated command at offset %d while decompressing" % (pos)
+
+        raw_size = _put(raw_data, raw_size, _ESCAPE_RE.sub(
+            _expand, compressed_data[pos:match.end()]))
+
+        pos = match.end()
+
+    return raw_data[start:min(stop, raw_size)]
+
+
+def iter_decompress(blocks):
+    """Lazily decompress a chain of blocks, one block at a time.
+
+    Decoding starts at the block with the lowest ID and follows each block
+    switch command as it's encountered, so blocks are only looked up in
+    ``blocks`` once they're needed. If ``blocks`` loads its blocks on demand,
+    the whole chain is never held in memory at once.
+
+    :param blocks: a map from block ID to block
+
+    :rtype: a generator of bytearrays, each holding the data decompressed from
+      one block
+    """
+    block_id = min(blocks.keys())
+
+    while True:
+        data = blocks[block_id].data
+
+        if not isinstance(data, (bytes, bytearray)):
+            data = bytearray(data)
+
+        raw_data, command = _decode(data)
+
+        assert command is not None, "Ran off the end of a block without " \
+            "encountering a block switch or EOF"
+
+        yield raw_data
+
+        if command == EOF_BYTE:
+            return
+
+        block_id = command
+
+
+def decompress_blocks(blocks, raw_data=None, stop=None):
+    """Decompress a chain of blocks into a buffer, without merging the blocks
+    first.
+
+    :param blocks: a map from block ID to block
+    :param raw_data: the bytearray to decompress into; a new buffer the size
+      of a song is allocated if not provided
+    :param stop: if provided, stop decompressing (and looking up blocks) as
+      soon as at least this many bytes have been produced
+
+    :rtype: the buffer holding the decompressed data, truncated to the number
+      of bytes that were decompressed
+    """
+    if raw_data is None:
+        raw_data = bytearray(RAW_DATA_SIZE)
+
+    raw_size = 0
+
+    for chunk in iter_decompress(blocks):
+        raw_size = _put(raw_data, raw_size, chunk)
+
+        if stop is not None and raw_size >= stop:
+            break
+
+    del raw_data[raw_size:]
+
+    return raw_data
+
+
+def compress(raw_data, mode=COMPRESS_GREEDY):
     """Compress raw bytes with the filepack algorithm.
 
     :param raw_data: an array of raw data bytes to compress
+    :param mode: ``"greedy"`` to compress the way LSDJ does, or ``"optimal"``
+      to produce the smallest possible compressed stream
 
     :rtype: a list of compressed bytes
     """
+    _check_compress_mode(mode)
+
+    if mode == COMPRESS_OPTIMAL:
+        return list(compress_bytes(raw_data, mode))
+
     raw_data = bytearray(raw_data)
     compressed_data = []
 
@@ -431,3 +716,203 @@ def compress(raw_data):
             index += 1
 
     return compressed_data
+
+
+def _encode(match):
+    """Encode a single token matched by ``_ENCODE_RE``."""
+    token_type = match.lastindex
+    token = match.group(token_type)
+
+    if token_type == 1:
+        return token + token
+    elif token_type == 2:
+        return bytes(bytearray([
+            SPECIAL_BYTE, DEFAULT_INSTR_BYTE,
+            len(token) // len(DEFAULT_INSTRUMENT_FILEPACK)]))
+    elif token_type == 3:
+        return bytes(bytearray([
+            SPECIAL_BYTE, DEFAULT_WAVE_BYTE, len(token) // len(DEFAULT_WAVE)]))
+    else:
+        return bytes(bytearray([RLE_BYTE, bytearray(token)[0], len(token)]))
+
+
+def compress_bytes(raw_data, mode=COMPRESS_GREEDY):
+    """Compress raw bytes with the filepack algorithm.
+
+    This is a faster equivalent of :py:func:`compress` that produces the same
+    output. In greedy mode, runs, default instruments and default waves are
+    found in a single pass by the regular expression engine, and literal bytes
+    between them are copied through in bulk.
+
+    :param raw_data: the raw data to compress
+    :param mode: ``"greedy"`` or ``"optimal"``; see :py:func:`compress`
+
+    :rtype: a bytearray of compressed bytes
+    """
+    _check_compress_mode(mode)
+
+    if not isinstance(raw_data, (bytes, bytearray)):
+        raw_data = bytearray(raw_data)
+
+    if mode == COMPRESS_OPTIMAL:
+        return _emit_plan(raw_data, _plan_optimal(raw_data)[1])
+
+    return bytearray(_ENCODE_RE.sub(_encode, raw_data))
+
+
+def compressed_size(raw_data, mode=COMPRESS_GREEDY):
+    """Compute the size of raw bytes once compressed with the filepack
+    algorithm, without necessarily building the compressed stream.
+
+    :param raw_data: the raw data to compress
+    :param mode: ``"greedy"`` or ``"optimal"``; see :py:func:`compress`
+
+    :rtype: the size of the compressed data in bytes
+    """
+    _check_compress_mode(mode)
+
+    if not isinstance(raw_data, (bytes, bytearray)):
+        raw_data = bytearray(raw_data)
+
+    if mode == COMPRESS_OPTIMAL:
+        return _plan_optimal(raw_data)[0][0]
+
+    return len(_ENCODE_RE.sub(_encode, raw_data))
+
+
+def _check_compress_mode(mode):
+    if mode not in COMPRESS_MODES:
+        raise ValueError("Unknown compression mode '%s'; expected one of %s" % (
+            mode, ', '.join(COMPRESS_MODES)))
+
+
+def _default_run_counts(raw_data, default):
+    """Find every run of a default pattern in raw data.
+
+    :rtype: a dict mapping each offset at which the pattern occurs to the
+      number of back-to-back copies of the pattern starting there
+    """
+    offsets = []
+    offset = raw_data.find(default)
+
+    while offset != -1:
+        offsets.append(offset)
+        offset = raw_data.find(default, offset + 1)
+
+    counts = {}
+    pattern_size = len(default)
+
+    for offset in reversed(offsets):
+        counts[offset] = counts.get(offset + pattern_size, 0) + 1
+
+    return counts
+
+
+# Token types chosen by the optimal compressor
+_TOKEN_LITERAL = 0
+_TOKEN_RLE = 1
+_TOKEN_DEFAULT_INSTR = 2
+_TOKEN_DEFAULT_WAVE = 3
+
+
+def _plan_optimal(raw_data):
+    """Find the smallest filepack encoding of raw data.
+
+    Works backwards from the end of the data, computing the cheapest encoding
+    of every suffix. At each offset the candidates are a literal (escaped if
+    it's a reserved byte), an RLE run, or a run of default instruments or
+    waves. An RLE run only ever needs to cover either as much of the current
+    run of identical bytes as it can, or all but its last byte (which may be
+    the start of a default instrument or wave); any other split can be merged
+    into a longer run at no extra cost.
+
+    :rtype: a ``(costs, choices)`` tuple, where ``costs[i]`` is the size of the
+      smallest encoding of ``raw_data[i:]`` and ``choices[i]`` is the
+      ``(token_type, count)`` that begins it
+    """
+    data_size = len(raw_data)
+
+    instr_size = len(DEFAULT_INSTRUMENT_FILEPACK)
+    wave_size = len(DEFAULT_WAVE)
+
+    instr_counts = _default_run_counts(raw_data, DEFAULT_INSTRUMENT_FILEPACK)
+    wave_counts = _default_run_counts(raw_data, DEFAULT_WAVE)
+
+    costs = [0] * (data_size + 1)
+    choices = [None] * data_size
+
+    run_length = 0
+
+    for index in range(data_size - 1, -1, -1):
+        current_byte = raw_data[index]
+
+        if index + 1 < data_size and raw_data[index + 1] == current_byte:
+            run_length += 1
+        else:
+            run_length = 1
+
+        if current_byte in RESERVED_BYTES:
+            best_cost = 2 + costs[index + 1]
+        else:
+            best_cost = 1 + costs[index + 1]
+
+        best_choice = (_TOKEN_LITERAL, 1)
+
+        # An RLE run can't repeat the RLE byte itself, since RLE_BYTE RLE_BYTE
+        # is an escaped RLE byte
+        if current_byte != RLE_BYTE and run_length > 1:
+            longest = min(run_length, 0xff)
+
+            for count in (longest, run_length - 1):
+                if 1 < count <= longest:
+                    cost = 3 + costs[index + count]
+
+                    if cost < best_cost:
+                        best_cost = cost
+                        best_choice = (_TOKEN_RLE, count)
+
+        for token_type, counts, pattern_size in (
+                (_TOKEN_DEFAULT_INSTR, instr_counts, instr_size),
+                (_TOKEN_DEFAULT_WAVE, wave_counts, wave_size)):
+            for count in range(1, min(counts.get(index, 0), 0xff) + 1):
+                cost = 3 + costs[index + count * pattern_size]
+
+                if cost < best_cost:
+                    best_cost = cost
+                    best_choice = (token_type, count)
+
+        costs[index] = best_cost
+        choices[index] = best_choice
+
+    return (costs, choices)
+
+
+def _emit_plan(raw_data, choices):
+    """Emit the compressed stream described by a plan from
+    :py:func:`_plan_optimal`."""
+    compressed_data = bytearray()
+
+    index = 0
+
+    while index < len(raw_data):
+        token_type, count = choices[index]
+
+        if token_type == _TOKEN_LITERAL:
+            current_byte = raw_data[index]
+
+            if current_byte in RESERVED_BYTES:
+                compressed_data.append(current_byte)
+
+            compressed_data.append(current_byte)
+            index += 1
+        elif token_type == _TOKEN_RLE:
+            compressed_data.extend([RLE_BYTE, raw_data[index], count])
+            index += count
+        elif token_type == _TOKEN_DEFAULT_INSTR:
+            compressed_data.extend([SPECIAL_BYTE, DEFAULT_INSTR_BYTE, count])
+            index += count * len(DEFAULT_INSTRUMENT_FILEPACK)
+        else:
+            compressed_data.extend([SPECIAL_BYTE, DEFAULT_WAVE_BYTE, count])
+            index += count * len(DEFAULT_WAVE)
+
+    return compressed_data
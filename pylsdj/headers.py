@@ -0,0 +1,174 @@
+"""Readers and writers for the small fixed-size headers in .sav and .lsdsng
+files.
+
+``bread_spec.compressed_sav_file`` and ``bread_spec.lsdsng_preamble`` are
+made entirely of whole bytes, so they can be read and written with a single
+precompiled ``struct.Struct`` rather than by interpreting their bread specs
+bit by bit. Passing ``validate=True`` to a reader also parses the data with
+bread and checks that the two agree.
+"""
+
+import collections
+import struct
+
+import bitstring
+import bread
+
+from . import bread_spec
+from . import exceptions
+from .vendor.six.moves import range
+
+NUM_FILES = 32
+FILENAME_LENGTH = 8
+BLOCK_ALLOC_TABLE_LENGTH = 191
+_PADDING_LENGTH = 30
+
+_SAV_HEADER_STRUCT = struct.Struct(
+    '>' + ('%ds' % FILENAME_LENGTH) * NUM_FILES + 'B' * NUM_FILES +
+    ('%ds2sB' % _PADDING_LENGTH) + 'B' * BLOCK_ALLOC_TABLE_LENGTH)
+
+_LSDSNG_PREAMBLE_STRUCT = struct.Struct('>%dsB' % (FILENAME_LENGTH))
+
+SAV_HEADER_SIZE = _SAV_HEADER_STRUCT.size
+LSDSNG_PREAMBLE_SIZE = _LSDSNG_PREAMBLE_STRUCT.size
+
+LsdsngPreamble = collections.namedtuple('LsdsngPreamble', ['name', 'version'])
+
+
+class SAVHeaderBlock(object):
+
+    """The header block of a .sav file, with the same fields as
+    ``bread_spec.compressed_sav_file``."""
+
+    def __init__(self, filenames, file_versions, sram_init_check,
+                 active_file, block_alloc_table, padding=None):
+        # Like bread, keep whatever the unused part of the block held so that
+        # it's written back unchanged
+        if padding is None:
+            padding = b'\0' * _PADDING_LENGTH
+
+        self._padding = padding
+
+        self.filenames = filenames
+        self.file_versions = file_versions
+        self.sram_init_check = sram_init_check
+        self.active_file = active_file
+        self.block_alloc_table = block_alloc_table
+
+    def as_native(self):
+        return {
+            'filenames': list(self.filenames),
+            'file_versions': list(self.file_versions),
+            'sram_init_check': self.sram_init_check,
+            'active_file': self.active_file,
+            'block_alloc_table': list(self.block_alloc_table)
+        }
+
+
+def _encode_name(name, length=FILENAME_LENGTH):
+    if type(name) != bytes:
+        name = name.encode('utf-8')
+
+    # struct would silently truncate a name that's too long
+    if len(name) > length:
+        raise ValueError("'%s' is longer than %d bytes" % (name, length))
+
+    return name
+
+
+def _unpack(struct_format, data):
+    try:
+        return struct_format.unpack(bytes(data[:struct_format.size]))
+    except struct.error:
+        raise exceptions.ImportException(
+            "Expected %d bytes of header data, got %d" %
+            (struct_format.size, len(data)))
+
+
+def _validate(data, spec, native):
+    try:
+        parsed = bread.parse(bytes(data), spec).as_native()
+    except bitstring.ReadError as e:
+        raise exceptions.ImportException(e)
+
+    for field, value in native.items():
+        if parsed[field] != value:
+            raise ValueError("Header field '%s' parsed as %s, but bread "
+                             "parsed it as %s" % (field, value, parsed[field]))
+
+
+def read_sav_header(data, validate=False):
+    """Parse a .sav file's header block.
+
+    :param data: the header block's data (at least ``SAV_HEADER_SIZE`` bytes)
+    :param validate: if True, also parse the data with bread and raise a
+      ValueError if the results differ
+    :rtype: a :py:class:`SAVHeaderBlock`
+    """
+    fields = _unpack(_SAV_HEADER_STRUCT, data)
+
+    header = SAVHeaderBlock(
+        filenames=list(fields[:NUM_FILES]),
+        file_versions=list(fields[NUM_FILES:2 * NUM_FILES]),
+        padding=fields[2 * NUM_FILES],
+        sram_init_check=fields[2 * NUM_FILES + 1],
+        active_file=fields[2 * NUM_FILES + 2],
+        block_alloc_table=list(fields[2 * NUM_FILES + 3:]))
+
+    if validate:
+        _validate(data[:SAV_HEADER_SIZE], bread_spec.compressed_sav_file,
+                  header.as_native())
+
+    return header
+
+
+def write_sav_header(header):
+    """Serialize a .sav file's header block.
+
+    :param header: a :py:class:`SAVHeaderBlock`, or anything else with the
+      same fields (in which case the unused part of the block is zeroed)
+    :rtype: the block's data, as ``bytes``
+    """
+    values = [_encode_name(header.filenames[i]) for i in range(NUM_FILES)]
+    values.extend(header.file_versions[i] for i in range(NUM_FILES))
+    values.append(getattr(header, '_padding', b'\0' * _PADDING_LENGTH))
+    values.append(_encode_name(header.sram_init_check, 2))
+    values.append(header.active_file)
+    values.extend(header.block_alloc_table[i]
+                  for i in range(BLOCK_ALLOC_TABLE_LENGTH))
+
+    try:
+        return _SAV_HEADER_STRUCT.pack(*values)
+    except struct.error as e:
+        raise ValueError(str(e))
+
+
+def read_lsdsng_preamble(data, validate=False):
+    """Parse the preamble of a .lsdsng file.
+
+    :param data: the preamble's data (at least ``LSDSNG_PREAMBLE_SIZE``
+      bytes)
+    :param validate: if True, also parse the data with bread and raise a
+      ValueError if the results differ
+    :rtype: a :py:class:`LsdsngPreamble`
+    """
+    preamble = LsdsngPreamble(*_unpack(_LSDSNG_PREAMBLE_STRUCT, data))
+
+    if validate:
+        _validate(data[:LSDSNG_PREAMBLE_SIZE], bread_spec.lsdsng_preamble,
+                  preamble._asdict())
+
+    return preamble
+
+
+def write_lsdsng_preamble(name, version):
+    """Serialize the preamble of a .lsdsng file.
+
+    :param name: the project's name
+    :param version: the project's version
+    :rtype: the preamble's data, as ``bytes``
+    """
+    try:
+        return _LSDSNG_PREAMBLE_STRUCT.pack(_encode_name(name), version)
+    except struct.error as e:
+        raise ValueError(str(e))
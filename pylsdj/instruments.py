@@ -18,13 +18,19 @@ class Instruments(object):
     def __init__(self, song):
         self.song = song
         self.alloc_table = song.song_data.instr_alloc_table
-        self.access_objects = []
 
-        for index in range(len(self.alloc_table)):
+        # Access objects are created the first time they're needed, once the
+        # instrument's type is known
+        self.access_objects = [None] * len(self.alloc_table)
+
+    def _access_object(self, index):
+        if self.access_objects[index] is None:
             instr_type = self.song.song_data.instruments[index].instrument_type
 
-            self.access_objects.append(
-                self.instrumentClasses[instr_type](song, index))
+            self.access_objects[index] = self.instrumentClasses[instr_type](
+                self.song, index)
+
+        return self.access_objects[index]
 
     def _set_instrument_type(self, index, instrument_type):
         assert instrument_type in Instruments.instrumentClasses, (
@@ -51,10 +57,11 @@ class Instruments(object):
         if not self.alloc_table[index]:
             return None
 
-        return self.access_objects[index]
+        return self._access_object(index)
 
     def as_list(self):
-        return self.access_objects
+        return [self._access_object(index)
+                for index in range(len(self.alloc_table))]
 
     def allocate(self, index, instrument_type):
         self.alloc_table[index] = True
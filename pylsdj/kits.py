@@ -1,11 +1,16 @@
+import collections
+import struct
 import wave
 
-import bread as b
-
 from .vendor.six.moves import range
 
-from .bread_spec import lsdj_rom_kits, KIT_SAMPLE_NAME_LENGTH, \
-    SAMPLES_PER_KIT, KIT_NAME_LENGTH, SAMPLE_START_ADDRESS, MAX_SAMPLE_LENGTH
+from . import layout
+from . import views
+from .bread_spec import lsdj_rom_kit, lsdj_rom_kits, \
+    KIT_SAMPLE_NAME_LENGTH, SAMPLES_PER_KIT, KIT_NAME_LENGTH, \
+    NUM_ROM_KITS, SAMPLE_START_ADDRESS, MAX_SAMPLE_LENGTH
+from .nibbles import pack_nibbles, unpack_nibbles, nibbles_to_samples, \
+    samples_to_nibbles
 from .utils import fixed_width_string
 
 
@@ -20,6 +25,56 @@ WAVE_FRAMERATE = 11468
 WAVE_PARAMS = (WAVE_NUM_CHANNELS, WAVE_SAMPLE_WIDTH, WAVE_FRAMERATE, 0,
                'NONE', 'not compressed')
 
+# The last four kits in the ROM are reserved for the speech synthesizer
+NUM_KITS = NUM_ROM_KITS - 4
+
+_KIT = views.compile_spec(lsdj_rom_kit)
+_KITS_LAYOUT = layout.fields(lsdj_rom_kits)['kits']
+_SAMPLE_DATA_LAYOUT = layout.fields(lsdj_rom_kit)['sample_data']
+
+# The fields at the start of each kit, up to and including its name, as laid
+# out in lsdj_rom_kit
+_KIT_HEADER_STRUCT = struct.Struct(
+    '<2B%dH2x%s3x%ds' % (SAMPLES_PER_KIT,
+                         ('%ds' % KIT_SAMPLE_NAME_LENGTH) * SAMPLES_PER_KIT,
+                         KIT_NAME_LENGTH))
+
+KitHeader = collections.namedtuple(
+    'KitHeader', ['name', 'sample_names', 'sample_bounds'])
+
+
+def _check_magic_number(magic_number):
+    if list(magic_number) != [0x60, 0x40]:
+        raise Exception(
+            'Expected magic number to be 0x60, 0x40, '
+            'but was %s' % (', '.join(map(hex, magic_number))))
+
+
+def _sample_used(sample_ends, index):
+    return sample_ends[index] > 0
+
+
+def _sample_bounds(sample_ends, index):
+    # Sample end addresses are relative to the start of the kit's sample
+    # memory; the spec subtracts SAMPLE_START_ADDRESS from them as they're
+    # read.
+    if index == 0:
+        sample_start = 0
+        sample_end = sample_ends[0]
+    else:
+        sample_start = sample_ends[index - 1]
+        sample_end = sample_ends[index]
+
+    # Multiply all sample bounds by two since we're dealing with nibbles
+    # and the offsets are stored as bytes
+    sample_start = sample_start * 2
+    sample_end = sample_end * 2
+
+    sample_start = max(sample_start, 0)
+    sample_end = max(sample_end, 0)
+
+    return (sample_start, sample_end)
+
 
 class Kits(object):
     """A wrapper for an LSDJ ROM's kits"""
@@ -30,36 +85,97 @@ class Kits(object):
         :param rom_file: path to the LSDJ ROM to load
         """
         with open(rom_file, 'rb') as fp:
-            self._data = b.parse(fp, lsdj_rom_kits)
+            self._rom = bytearray(fp.read())
+
+        # Kits are created the first time they're accessed
+        self._kits = [None] * NUM_KITS
+
+    def _kit_offset(self, index):
+        return layout.byte_offset(_KITS_LAYOUT, index)
+
+    def _kit(self, index):
+        if self._kits[index] is None:
+            kit_offset = self._kit_offset(index)
+            start, stop = layout.byte_range(_SAMPLE_DATA_LAYOUT)
+
+            self._kits[index] = Kit(
+                views.StructView(self._rom, kit_offset * 8, _KIT),
+                memoryview(self._rom)[kit_offset + start:kit_offset + stop])
+
+        return self._kits[index]
+
+    def headers(self):
+        """Read each kit's name, sample names and sample bounds, without
+        loading the kits themselves.
+
+        :rtype: a list of ``KitHeader(name, sample_names, sample_bounds)``
+          tuples, one per kit. ``sample_bounds`` holds a ``(start, end)``
+          tuple of nibble offsets into the kit's sample memory for each
+          sample in use, and None for each sample that isn't.
+        """
+        headers = []
+
+        for index in range(NUM_KITS):
+            fields = _KIT_HEADER_STRUCT.unpack_from(
+                self._rom, self._kit_offset(index))
+
+            _check_magic_number(fields[:2])
+
+            sample_ends = [end - SAMPLE_START_ADDRESS
+                           for end in fields[2:2 + SAMPLES_PER_KIT]]
+
+            sample_bounds = [
+                _sample_bounds(sample_ends, i)
+                if _sample_used(sample_ends, i) else None
+                for i in range(SAMPLES_PER_KIT)]
+
+            headers.append(KitHeader(
+                name=fields[-1],
+                sample_names=list(fields[2 + SAMPLES_PER_KIT:-1]),
+                sample_bounds=sample_bounds))
 
-        # Don't include the last four kits in the kit list, which are reserved
-        # for the speech synthesizer
-        self._kits = list(map(lambda k: Kit(k), self._data.kits[:-4]))
+        return headers
+
+    def __len__(self):
+        return NUM_KITS
 
     def __getitem__(self, i):
-        return self._kits[i]
+        # Indexing a range handles negative indices and slices, and raises
+        # an IndexError for indices out of range, just as a list would
+        indices = range(NUM_KITS)[i]
+
+        if type(i) is slice:
+            return [self._kit(index) for index in indices]
+
+        return self._kit(indices)
 
     def __str__(self):
-        return '\n'.join(map(str, self._kits))
+        return '\n'.join(map(str, self))
 
     def __iter__(self):
-        for kit in self._kits:
-            yield kit
+        for index in range(NUM_KITS):
+            yield self._kit(index)
 
 
 class Kit(object):
     """An individual sample kit"""
 
-    def __init__(self, data):
+    def __init__(self, data, sample_memory):
+        """Constructor.
+
+        :param data: the kit's data, with the fields described by
+          ``bread_spec.lsdj_rom_kit``
+        :param sample_memory: the kit's sample memory, as a writable buffer
+          of packed nibbles
+        """
         self._data = data
+        self._sample_memory = sample_memory
 
-        if self._data.magic_number != [0x60, 0x40]:
-            raise Exception(
-                'Expected magic number to be 0x60, 0x40, '
-                'but was %s' % (', '.join(map(hex, self._data.magic_number))))
+        _check_magic_number(self._data.magic_number)
 
-        self._samples = list(map(lambda i: KitSample(self._data, i),
-                                 range(SAMPLES_PER_KIT)))
+        self._samples = list(map(
+            lambda i: KitSample(self._data, self._sample_memory, i),
+            range(SAMPLES_PER_KIT)))
 
     @property
     def name(self):
@@ -88,8 +204,9 @@ class Kit(object):
 
 
 class KitSample(object):
-    def __init__(self, data, index):
+    def __init__(self, data, sample_memory, index):
         self._data = data
+        self._sample_memory = sample_memory
         self.index = index
 
         # Because of data layout, indices for bits are
@@ -104,7 +221,7 @@ class KitSample(object):
             self.force_loop_index = 15 - (self.index - 8)
 
     def _sample_used(self, index):
-        return (self._data.sample_ends[index] > 0)
+        return _sample_used(self._data.sample_ends, index)
 
     def _get_sample_data_bounds(self, index=None, sample_ends=None):
         if index is None:
@@ -113,26 +230,7 @@ class KitSample(object):
         if sample_ends is None:
             sample_ends = self._data.sample_ends
 
-        if index == 0:
-            sample_start = 0
-            sample_end = sample_ends[0]
-        else:
-            sample_start = sample_ends[index - 1]
-            sample_end = sample_ends[index]
-
-        # Sample end addresses are relative to the start of the kit's sample memory
-        sample_start = sample_start - SAMPLE_START_ADDRESS
-        sample_end = sample_end - SAMPLE_START_ADDRESS
-
-        # Multiply all sample bounds by two since we're dealing with nibbles
-        # and the offsets are stored as bytes
-        sample_start = sample_start * 2
-        sample_end = sample_end * 2
-
-        sample_start = max(sample_start, 0)
-        sample_end = max(sample_end, 0)
-
-        return (sample_start, sample_end)
+        return _sample_bounds(sample_ends, index)
 
     def _get_sample_length(self, index):
         if not self._sample_used(index):
@@ -146,9 +244,12 @@ class KitSample(object):
         if not self._sample_used(index):
             return None
 
+        return unpack_nibbles(self._get_packed_sample_data(index))
+
+    def _get_packed_sample_data(self, index):
         sample_start, sample_end = self._get_sample_data_bounds(index)
 
-        return bytearray(self._data.sample_data[sample_start:sample_end])
+        return self._sample_memory[sample_start // 2:sample_end // 2]
 
     @property
     def force_loop(self):
@@ -176,7 +277,8 @@ class KitSample(object):
 
     @property
     def sample_data(self):
-        """The raw hex nibbles that comprise the sample"""
+        """The raw hex nibbles that comprise the sample, as a ``bytearray``
+        with one nibble per byte"""
         return self._get_sample_data(self.index)
 
     @sample_data.setter
@@ -184,9 +286,13 @@ class KitSample(object):
         # For simplicity, we'll just pack samples into their new locations and
         # overwrite the sample memory for the kit.
 
+        # Sample ends are stored in bytes, so a sample can't end halfway
+        # through one
+        sample_data = sample_data[:len(sample_data) - len(sample_data) % 2]
+
         new_sample_ends = []
 
-        new_sample_data = []
+        new_sample_memory = bytearray()
 
         for i in range(SAMPLES_PER_KIT):
             if not self._sample_used(i) and i != self.index:
@@ -196,24 +302,22 @@ class KitSample(object):
                 break
 
             if i == self.index:
-                new_sample_data.extend(sample_data)
+                new_sample_memory.extend(pack_nibbles(sample_data))
             else:
-                current_sample_data = self._get_sample_data(i)
-
-                if current_sample_data is not None:
-                    new_sample_data.extend(current_sample_data)
+                new_sample_memory.extend(self._get_packed_sample_data(i))
 
-            new_sample_ends.append(int(len(new_sample_data) / 2))
+            new_sample_ends.append(len(new_sample_memory))
 
         if len(new_sample_ends) < SAMPLES_PER_KIT:
             new_sample_ends.extend([0] * (SAMPLES_PER_KIT - len(new_sample_ends)))
 
-        if len(new_sample_data) < MAX_SAMPLE_LENGTH * 2:
-            new_sample_data.extend([0] * ((MAX_SAMPLE_LENGTH * 2) - len(new_sample_data)))
-        elif len(new_sample_data) > MAX_SAMPLE_LENGTH * 2:
+        if len(new_sample_memory) < MAX_SAMPLE_LENGTH:
+            new_sample_memory.extend(
+                b'\0' * (MAX_SAMPLE_LENGTH - len(new_sample_memory)))
+        elif len(new_sample_memory) > MAX_SAMPLE_LENGTH:
             raise Exception('Not enough sample memory to add this sample to its kit')
 
-        self._data.sample_data = new_sample_data
+        self._sample_memory[:] = bytes(new_sample_memory)
         self._data.sample_ends = new_sample_ends
 
     def __str__(self):
@@ -238,9 +342,7 @@ class KitSample(object):
 
             wave_output.setparams(WAVE_PARAMS)
 
-            frames = bytearray([x << 4 for x in self.sample_data])
-
-            wave_output.writeframes(frames)
+            wave_output.writeframes(nibbles_to_samples(self.sample_data))
         finally:
             if wave_output is not None:
                 wave_output.close()
@@ -254,11 +356,9 @@ class KitSample(object):
 
         try:
             wave_input = wave.open(filename, 'r')
-            wave_frames = bytearray(
+            self.sample_data = samples_to_nibbles(
                 wave_input.readframes(wave_input.getnframes()))
 
-            self.sample_data = [x >> 4 for x in wave_frames]
-
         finally:
             if wave_input is not None:
                 wave_input.close()
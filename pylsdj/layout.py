@@ -0,0 +1,161 @@
+"""Offsets and sizes of the fields in pylsdj's bread specs.
+
+The layouts are computed once, when this module is first imported, so that
+fields can be located in raw data without parsing the rest of it.
+
+Every named field gets an entry, including the members of structs that are
+nested inside arrays. Nested fields are named with dotted paths; for example,
+``SONG_LAYOUT['song.pu1']`` locates the pulse 1 chain of every row of the
+song. Fields inside a conditional are named after the condition that selects
+them, so ``SONG_LAYOUT['instruments.pulse.envelope']`` locates the envelope of
+every instrument that is a pulse instrument.
+"""
+
+import collections
+
+import bread
+
+from . import bread_spec
+
+# The location of a named field within a spec. Offsets and sizes are in bits.
+#
+# offset is the offset of the field's first element and size is the number
+# of bits between the start of its first element and the end of its last.
+# shape holds the dimensions of the arrays that the field belongs to, from the
+# outermost inwards, and strides holds the distance in bits between
+# consecutive elements along each of those dimensions. item_size is the size
+# of one element. Fields that aren't in an array have empty shapes and
+# strides, and their item_size and size are the same.
+FieldLayout = collections.namedtuple(
+    'FieldLayout',
+    ['name', 'offset', 'size', 'spec', 'shape', 'strides', 'item_size'])
+
+
+def _spec_lines(spec):
+    # Dictionaries in a spec hold global options rather than fields
+    return [spec_line for spec_line in spec if type(spec_line) != dict]
+
+
+def _add_struct_fields(layouts, struct, spec, prefix, shape, strides):
+    for spec_line, field in zip(_spec_lines(spec), struct._field_list):
+        if isinstance(field, bread.BreadConditional):
+            conditions = spec_line[2]
+
+            for condition in sorted(conditions.keys()):
+                _add_struct_fields(
+                    layouts, field._conditions[condition],
+                    conditions[condition], prefix + condition + '.',
+                    shape, strides)
+        elif field._name[0] != '_':
+            # Unnamed fields are padding
+            _add_field(
+                layouts, prefix + field._name, field, spec_line, shape, strides)
+
+
+def _add_field(layouts, name, field, spec_line, shape, strides):
+    # field is the field's first element, which bread has already placed
+    item = field
+    item_spec = spec_line[1]
+
+    while isinstance(item, bread.BreadArray):
+        shape += (item._num_items,)
+        strides += (item._item_length,)
+        item_spec = item._item_spec
+        item = item._get_accessor_item(0)
+
+    size = item._length + sum(
+        (count - 1) * stride for count, stride in zip(shape, strides))
+
+    layouts[name] = FieldLayout(
+        name, field._offset, size, spec_line, shape, strides, item._length)
+
+    if isinstance(item, bread.BreadStruct):
+        _add_struct_fields(
+            layouts, item, item_spec, name + '.', shape, strides)
+
+
+def fields(spec):
+    """Compute the layout of every named field in a spec, including fields
+    nested inside structs and arrays of structs.
+
+    :param spec: a bread spec
+    :rtype: an OrderedDict mapping dotted field names to FieldLayouts, with
+      each field followed by the fields nested inside it
+    """
+    layouts = collections.OrderedDict()
+
+    _add_struct_fields(layouts, bread.new(spec), spec, '', (), ())
+
+    return layouts
+
+
+def top_level_fields(spec):
+    """Compute the layout of each named top-level field in a spec.
+
+    :param spec: a bread spec
+    :rtype: an OrderedDict mapping field names to FieldLayouts, in the order
+      in which the fields appear in the spec
+    """
+    return _top_level(fields(spec))
+
+
+def _top_level(layouts):
+    return collections.OrderedDict(
+        (name, field) for name, field in layouts.items() if '.' not in name)
+
+
+def bit_offset(field, *indices):
+    """The offset of one element of a field.
+
+    :param field: a FieldLayout
+    :param indices: the element's index along each dimension of the field's
+      shape; trailing dimensions that are omitted are taken to be 0
+    :rtype: the element's offset in bits
+    """
+    if len(indices) > len(field.shape):
+        raise ValueError("%s has %d dimensions, but %d indices were given" %
+                         (field.name, len(field.shape), len(indices)))
+
+    offset = field.offset
+
+    for index, count, stride in zip(indices, field.shape, field.strides):
+        if not 0 <= index < count:
+            raise IndexError("Index %d out of range for %s (dimension of "
+                             "size %d)" % (index, field.name, count))
+
+        offset += index * stride
+
+    return offset
+
+
+def byte_offset(field, *indices):
+    """The offset of one element of a byte-aligned field.
+
+    :param field: a FieldLayout
+    :param indices: the element's index along each dimension of the field's
+      shape, as for :py:func:`bit_offset`
+    :rtype: the element's offset in bytes
+    """
+    offset = bit_offset(field, *indices)
+
+    if offset % 8 != 0:
+        raise ValueError("Element of %s at %s isn't byte-aligned" %
+                         (field.name, indices))
+
+    return offset // 8
+
+
+def byte_range(field):
+    """The range of bytes that a field occupies.
+
+    :param field: a FieldLayout
+    :rtype: a ``(start, stop)`` tuple of byte offsets
+    """
+    return (field.offset // 8, (field.offset + field.size + 7) // 8)
+
+
+SONG_LAYOUT = fields(bread_spec.song)
+INSTRUMENT_LAYOUT = fields(bread_spec.instrument)
+SAV_HEADER_LAYOUT = fields(bread_spec.compressed_sav_file)
+
+SONG_FIELDS = _top_level(SONG_LAYOUT)
@@ -0,0 +1,115 @@
+"""Convert between packed bytes and arrays of 4-bit values (nibbles).
+
+Wave frames and kit samples are stored two 4-bit values to a byte, high nibble
+first. bread reads such arrays one nibble at a time; these functions convert
+whole runs of bytes at once, with ``bytes.translate`` (or NumPy, when it's
+installed) doing the per-byte work.
+"""
+
+from .vendor.six.moves import range
+
+# Maps each byte to its high and low nibble, respectively
+_HIGH_NIBBLES = bytes(bytearray(byte >> 4 for byte in range(0x100)))
+_LOW_NIBBLES = bytes(bytearray(byte & 0xf for byte in range(0x100)))
+
+# Maps each nibble to the 8-bit sample with that nibble as its high nibble
+_SAMPLES = bytes(bytearray((byte << 4) & 0xff for byte in range(0x100)))
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        return None
+
+    return numpy
+
+
+def _bytes(data):
+    # bytes() of a memoryview is its repr on Python 2
+    if isinstance(data, memoryview):
+        return data.tobytes()
+
+    return bytes(data)
+
+
+def _check_nibbles(nibbles):
+    # nibbles have already been converted to bytes, so they can't be negative
+    if len(nibbles) > 0 and max(bytearray(nibbles)) > 0xf:
+        raise ValueError("Nibbles must be between 0 and 15")
+
+
+def unpack_nibbles(data):
+    """Split bytes into the nibbles that they hold.
+
+    :param data: the packed data (any bytes-like object)
+    :rtype: a ``bytearray`` holding two nibbles per byte of ``data``, high
+      nibble first
+    """
+    data = _bytes(data)
+
+    nibbles = bytearray(len(data) * 2)
+    nibbles[0::2] = data.translate(_HIGH_NIBBLES)
+    nibbles[1::2] = data.translate(_LOW_NIBBLES)
+
+    return nibbles
+
+
+def pack_nibbles(nibbles):
+    """Combine pairs of nibbles into bytes; the inverse of
+    :py:func:`unpack_nibbles`.
+
+    :param nibbles: an even number of values between 0 and 15 (a list,
+      ``bytes``, ``bytearray`` or NumPy array, for example)
+    :rtype: ``bytes`` holding one byte for every two nibbles
+    :raises ValueError: if there's an odd number of nibbles, or a value is out
+      of range
+    """
+    if len(nibbles) % 2 != 0:
+        raise ValueError("Can't pack an odd number (%d) of nibbles into "
+                         "bytes" % (len(nibbles)))
+
+    np = _numpy()
+
+    if np is not None:
+        if isinstance(nibbles, (bytes, bytearray, memoryview)):
+            # np.asarray would make a single string of these
+            nibbles = np.frombuffer(nibbles, dtype=np.uint8)
+        else:
+            nibbles = np.asarray(nibbles)
+
+        if nibbles.size > 0 and (nibbles.min() < 0 or nibbles.max() > 0xf):
+            raise ValueError("Nibbles must be between 0 and 15")
+
+        nibbles = nibbles.astype(np.uint8)
+
+        return ((nibbles[0::2] << 4) | nibbles[1::2]).tobytes()
+
+    nibbles = bytearray(nibbles)
+    _check_nibbles(nibbles)
+
+    # NumPy isn't available, so pack the nibbles in Python
+    return bytes(bytearray((high << 4) | low for high, low
+                           in zip(nibbles[0::2], nibbles[1::2])))
+
+
+def nibbles_to_samples(nibbles):
+    """Scale nibbles up to 8-bit unsigned samples (as in a WAV file).
+
+    :param nibbles: values between 0 and 15
+    :rtype: ``bytes`` holding one sample per nibble
+    """
+    nibbles = bytes(bytearray(nibbles))
+    _check_nibbles(nibbles)
+
+    return nibbles.translate(_SAMPLES)
+
+
+def samples_to_nibbles(samples):
+    """Reduce 8-bit unsigned samples to nibbles by dropping their low four
+    bits.
+
+    :param samples: the samples (any bytes-like object)
+    :rtype: a ``bytearray`` holding one nibble per sample
+    """
+    return bytearray(_bytes(samples).translate(_HIGH_NIBBLES))
@@ -1,55 +1,50 @@
-import math
-import bread
-from . import bread_spec as spec
 from .song import Song
 from . import filepack
 from . import blockutils
-from .blockutils import BlockReader, BlockWriter, BlockFactory
+from . import headers
+from . import layout
+from .views import SongData, song_field
+from .blockutils import BlockWriter, BlockFactory
+from .vendor.six.moves import range
 
 
-def load_lsdsng(filename):
+def load_lsdsng(filename, cache=None, validate=False):
     """Load a Project from a ``.lsdsng`` file.
 
     :param filename: the name of the file from which to load
+    :param cache: a :py:class:`pylsdj.cache.ProjectCache` from which to fetch
+      (and in which to store) the project's decompressed song
+    :param validate: if True, check the parsed preamble against the one that
+      bread parses from the same data
     :rtype: :py:class:`pylsdj.Project`
     """
 
-    # Load preamble data so that we know the name and version of the song
     with open(filename, 'rb') as fp:
-        preamble_data = bread.parse(fp, spec.lsdsng_preamble)
+        file_data = fp.read()
 
-    with open(filename, 'rb') as fp:
-        # Skip the preamble this time around
-        fp.seek(int(len(preamble_data) / 8))
-
-        # Load compressed data into a block map and use BlockReader to
-        # decompress it
-        factory = BlockFactory()
-
-        while True:
-            block_data = bytearray(fp.read(blockutils.BLOCK_SIZE))
-
-            if len(block_data) == 0:
-                break
-
-            block = factory.new_block()
-            block.data = block_data
+    # The preamble holds the name and version of the song
+    preamble = headers.read_lsdsng_preamble(file_data, validate=validate)
 
-        remapped_blocks = filepack.renumber_block_keys(factory.blocks)
+    # The rest of the file is compressed data; slice it into blocks. (Blocks
+    # hold bytes rather than memoryviews so that projects can be pickled.)
+    blocks = {}
 
-        reader = BlockReader()
-        compressed_data = reader.read(remapped_blocks)
+    for start in range(headers.LSDSNG_PREAMBLE_SIZE, len(file_data),
+                       blockutils.BLOCK_SIZE):
+        block_id = len(blocks)
+        blocks[block_id] = blockutils.Block(
+            block_id, file_data[start:start + blockutils.BLOCK_SIZE])
 
-        # Now, decompress the raw data and use it and the preamble to construct
-        # a Project
-        raw_data = filepack.decompress(compressed_data)
+    remapped_blocks = filepack.renumber_block_keys(blocks)
 
-        name = preamble_data.name
-        version = preamble_data.version
-        size_blks = int(math.ceil(
-            float(len(compressed_data)) / blockutils.BLOCK_SIZE))
+    # Use the blocks and the preamble to construct a Project; the song is
+    # decompressed block by block when it's first needed
+    name = preamble.name
+    version = preamble.version
+    size_blks = len(remapped_blocks)
 
-        return Project(name, version, size_blks, raw_data)
+    return Project(name, version, size_blks, None, blocks=remapped_blocks,
+                   cache=cache)
 
 
 def load_srm(filename):
@@ -66,7 +61,7 @@ def load_srm(filename):
     with open(filename, 'rb') as fp:
         raw_data = fp.read()
 
-    compressed_data = filepack.compress(raw_data)
+    compressed_data = filepack.compress_bytes(raw_data)
 
     factory = BlockFactory()
     writer = BlockWriter()
@@ -82,9 +77,32 @@ def load_srm(filename):
     return Project(name, version, size_in_blocks, raw_data)
 
 
+def _as_bytearray(data):
+    # Raw data is kept as a bytearray, whatever form it was provided in, so
+    # that it can be compared with a bytes snapshot of itself and viewed by
+    # SongData without being copied
+    if data is None or isinstance(data, bytearray):
+        return data
+
+    return bytearray(data)
+
+
 class Project(object):
 
-    def __init__(self, name, version, size_blks, data):
+    def __init__(self, name, version, size_blks, data, blocks=None,
+                 cache=None):
+        """Constructor.
+
+        :param name: the project's name
+        :param version: the project's version
+        :param size_blks: the size of the song in filesystem blocks
+        :param data: the song's raw (decompressed) data, or None if ``blocks``
+          is provided
+        :param blocks: a map from block ID to the blocks holding the song's
+          compressed data, decompressed lazily if ``data`` is None
+        :param cache: a :py:class:`pylsdj.cache.ProjectCache` to consult when
+          decompressing ``blocks``
+        """
         self.name = name
         """the project's name"""
 
@@ -102,18 +120,80 @@ class Project(object):
         # raw data on-demand
         self.__song_data = None
         self._song = None
-        self._raw_bytes = data
+        self.__raw_bytes = _as_bytearray(data)
+        self._blocks = blocks
+        self._cache = cache
+
+        # A copy of the song's raw data as it was loaded, taken when the raw
+        # data is first needed, so that we can tell whether it has changed
+        self.__original_raw_bytes = None
+
+        if data is not None:
+            self.__original_raw_bytes = bytes(self.__raw_bytes)
+
+    @property
+    def _raw_bytes(self):
+        if self.__raw_bytes is None:
+            if self._cache is not None:
+                raw_bytes = self._cache.decompress(self._blocks)
+            else:
+                raw_bytes = filepack.decompress_blocks(self._blocks)
+
+            self.__raw_bytes = _as_bytearray(raw_bytes)
+
+            self.__original_raw_bytes = bytes(self.__raw_bytes)
+
+        return self.__raw_bytes
+
+    @_raw_bytes.setter
+    def _raw_bytes(self, value):
+        self.__raw_bytes = _as_bytearray(value)
+
+        # Any existing song refers to the old raw data
+        self.__song_data = None
+        self._song = None
+
+    @property
+    def dirty(self):
+        """True if the project's song has changed since it was loaded"""
+        if self.__raw_bytes is None:
+            # The song hasn't even been decompressed
+            return False
+
+        return self.__raw_bytes != self.__original_raw_bytes
+
+    def _original_blocks(self):
+        # The blocks that the song was loaded from, in the order in which
+        # they're read, or None if they can't be reused because the song
+        # wasn't loaded from blocks or has changed since
+        if self._blocks is None or self.dirty:
+            return None
+
+        return filepack.block_chain(self._blocks)
+
+    def _raw_range(self, start, stop):
+        if self.__raw_bytes is None:
+            # Only decompress as many blocks as we need
+            return filepack.decompress_blocks(self._blocks, stop=stop)[
+                start:stop]
+
+        return self.__raw_bytes[start:stop]
 
     @property
     def _song_data(self):
         if self.__song_data is None:
-            self.__song_data = bread.parse(self._raw_bytes, spec.song)
+            self.__song_data = SongData(self._raw_bytes)
+
+            # The song data refers to the raw data directly, so changes to the
+            # song are changes to the raw data
+            self.__raw_bytes = self.__song_data.raw_data
 
         return self.__song_data
 
     @_song_data.setter
     def _song_data(self, value):
         self.__song_data = value
+        self.__raw_bytes = value.raw_data
 
     @property
     def song(self):
@@ -127,8 +207,31 @@ class Project(object):
     def song(self, value):
         self._song = value
 
+    def read_field(self, name):
+        """Read a single top-level field of the project's song (see
+        ``bread_spec.song``) without parsing the whole song and, if the song
+        hasn't been decompressed yet, without decompressing any more of it than
+        is needed to reach the field.
+
+        :param name: the field's name, e.g. ``"tempo"`` or
+          ``"instrument_names"``
+        :rtype: the field's value
+        """
+        if name not in layout.SONG_FIELDS:
+            raise ValueError("Unknown song field '%s'" % (name))
+
+        if self.__song_data is not None:
+            # The song may have been modified since it was parsed
+            return getattr(self.__song_data, name)
+
+        start, stop = layout.byte_range(layout.SONG_FIELDS[name])
+
+        return song_field(bytearray(self._raw_range(start, stop)), start, name)
+
     def get_raw_data(self):
-        return bread.write(self._song_data, spec.song)
+        # The song data (if any) writes its changes to the raw data, so
+        # there's never any need to serialize it
+        return bytearray(self._raw_bytes)
 
     def save(self, filename):
         """Save a project in .lsdsng format to the target file.
@@ -137,26 +240,28 @@ class Project(object):
 
         :deprecated: use ``save_lsdsng(filename)`` instead
         """
-        with open(filename, 'wb') as fp:
-            writer = BlockWriter()
-            factory = BlockFactory()
+        writer = BlockWriter()
+        factory = BlockFactory()
 
-            preamble_dummy_bytes = bytearray([0] * 9)
-            preamble = bread.parse(
-                preamble_dummy_bytes, spec.lsdsng_preamble)
-            preamble.name = self.name
-            preamble.version = self.version
+        original_blocks = self._original_blocks()
 
-            preamble_data = bread.write(preamble)
+        if original_blocks is None:
             raw_data = self.get_raw_data()
-            compressed_data = filepack.compress(raw_data)
+            compressed_data = filepack.compress_bytes(raw_data)
 
             writer.write(compressed_data, factory)
+        else:
+            writer.copy(original_blocks, factory)
 
-            fp.write(preamble_data)
+        # Assemble the whole file so that it can be written all at once
+        file_data = bytearray(
+            headers.write_lsdsng_preamble(self.name, self.version))
 
-            for key in sorted(factory.blocks.keys()):
-                fp.write(bytearray(factory.blocks[key].data))
+        for key in sorted(factory.blocks.keys()):
+            file_data.extend(factory.blocks[key].data)
+
+        with open(filename, 'wb') as fp:
+            fp.write(file_data)
 
     def save_lsdsng(self, filename):
         """Save a project in .lsdsng format to the target file.
@@ -171,8 +276,7 @@ class Project(object):
         :param filename: the name of the file to which to save
         """
         with open(filename, 'wb') as fp:
-            raw_data = bread.write(self._song_data, spec.song)
-            fp.write(raw_data)
+            fp.write(self.get_raw_data())
 
     def __eq__(self, other):
         if other is None:
@@ -1,16 +1,16 @@
-from . import bread_spec
-import bread
 import os
 import sys
 from . import utils
 from .project import Project
 from . import blockutils
-from .blockutils import BlockReader, BlockWriter, BlockFactory
+from .blockutils import BlockWriter, BlockFactory
 from . import filepack
 import collections
-import bitstring
+import mmap as _mmap
 from . import exceptions
+from . import headers
 
+from .vendor import six
 from .vendor.six.moves import range
 
 # Start index for data blocks
@@ -22,17 +22,177 @@ NUM_FILES = 0x20
 # Constants
 EMPTY_BLOCK = 0xff
 
+SAVHeader = collections.namedtuple(
+    'SAVHeader',
+    ['filenames', 'file_versions', 'active_file', 'block_counts'])
+"""The parts of a .sav file's header needed to list its projects.
+``filenames`` and ``file_versions`` have an entry for each of the file's 32
+slots, and ``block_counts`` holds the number of blocks that each slot's
+project occupies (0 for empty slots)."""
+
 # By default, SAV file loading doesn't trigger any callback action
 def _noop_callback(message, step, total_steps, continuing):
     pass
 
+def _decompress_block_data(block_data):
+    # Decompress a project given a map from block number to block bytes. Runs
+    # in worker processes, so it only deals in picklable values
+    blocks = dict((block_number, blockutils.Block(block_number, data))
+                  for block_number, data in block_data.items())
+
+    return filepack.decompress_blocks(blocks)
+
+def _map_file(fp):
+    # Map a file read-only into memory
+    return _mmap.mmap(fp.fileno(), 0, access=_mmap.ACCESS_READ)
+
+def _read_at(fp, offset, length):
+    if hasattr(os, 'pread'):
+        return os.pread(fp.fileno(), length, offset)
+
+    fp.seek(offset)
+    return fp.read(length)
+
+def scan_header(path):
+    """Read just the header of a .sav file, without loading any of its
+    projects. Much faster than constructing a :py:class:`SAVFile` when all
+    that's needed is a listing of the file's projects.
+
+    :param path: the .sav file to read
+    :rtype: a :py:class:`SAVHeader`
+    """
+    with open(path, 'rb') as fp:
+        header_data = _read_at(fp, BLOCKS_START_OFFSET, blockutils.BLOCK_SIZE)
+
+    if len(header_data) != blockutils.BLOCK_SIZE:
+        raise exceptions.ImportException(
+            "File is too short to contain a header block (%d bytes)" %
+            (BLOCKS_START_OFFSET + len(header_data)))
+
+    header = headers.read_sav_header(header_data)
+
+    if header.sram_init_check != b'jk':
+        raise ValueError(
+            "SRAM init check bits incorrect (should be 'jk', was '%s')" %
+            (header.sram_init_check))
+
+    block_index = BlockIndex(header.block_alloc_table)
+    block_counts = tuple(block_index.size_blks(file_number)
+                         for file_number in range(NUM_FILES))
+
+    return SAVHeader(tuple(header.filenames), tuple(header.file_versions),
+                     header.active_file, block_counts)
+
+class BlockIndex(object):
+
+    """An index of a .sav file's block allocation table, built in a single
+    pass over the table.
+
+    Blocks whose table entries are neither a file number (less than
+    ``NUM_FILES``) nor ``EMPTY_BLOCK`` are corrupt, and are treated as
+    belonging to no file without being free either.
+    """
+
+    def __init__(self, block_alloc_table):
+        """Constructor.
+
+        :param block_alloc_table: the .sav file's block allocation table,
+          which maps each block (other than the header block) to the number
+          of the file that it belongs to
+        """
+        self._file_blocks = {}
+
+        self.free_blocks = []
+        """the numbers of the blocks that don't belong to any file"""
+
+        # Block 0 is the header block, so the table's indices are off by one
+        for block_number, file_number in enumerate(block_alloc_table, 1):
+            if file_number == EMPTY_BLOCK:
+                self.free_blocks.append(block_number)
+            elif file_number < NUM_FILES:
+                self._file_blocks.setdefault(file_number, []).append(
+                    block_number)
+
+    def blocks(self, file_number):
+        """The blocks that a file occupies.
+
+        :param file_number: the file's number
+        :rtype: a list of block numbers, in ascending order; empty if the file
+          doesn't exist
+        """
+        return list(self._file_blocks.get(file_number, []))
+
+    def size_blks(self, file_number):
+        """The size of a file in blocks.
+
+        :param file_number: the file's number
+        :rtype: the number of blocks the file occupies, or 0 if it doesn't
+          exist
+        """
+        return len(self._file_blocks.get(file_number, []))
+
+    def file_numbers(self):
+        """The numbers of the files that occupy at least one block.
+
+        :rtype: a sorted list of file numbers
+        """
+        return sorted(self._file_blocks.keys())
+
+    @property
+    def num_free_blocks(self):
+        """the number of blocks that don't belong to any file"""
+        return len(self.free_blocks)
+
 class ProjectList(object):
-    def __init__(self, filename, header_block):
+    def __init__(self, filename, header_block, block_index=None,
+                 file_data=None, cache=None):
         self.filename = filename
         self.header_block = header_block
 
+        # The ProjectCache, if any, that projects use to decompress their
+        # songs
+        self._cache = cache
+
+        if block_index is None:
+            block_index = BlockIndex(header_block.block_alloc_table)
+
+        self.block_index = block_index
+
+        # If provided, a memoryview of the whole .sav file, from which blocks
+        # are copied rather than read
+        self._file_data = file_data
+
+        # Every block map made from file_data, including those of projects
+        # that have since been replaced, so that close() can detach them all
+        self._block_maps = []
+
+        # True once file_data has been released; see close()
+        self._closed = False
+
         self._projects = {}
 
+    def close(self):
+        """Stop referring to the file's data. Projects that have already been
+        loaded get copies of their blocks; projects that haven't can't be
+        loaded any more."""
+        if self._file_data is None:
+            return
+
+        for block_map in self._block_maps:
+            block_map.detach()
+
+        self._block_maps = []
+
+        # Python 2's memoryviews can't be released, and its mmaps are used
+        # directly anyway
+        release = getattr(self._file_data, 'release', None)
+
+        if release is not None:
+            release()
+
+        self._file_data = None
+        self._closed = True
+
     def __eq__(self, other):
         if not isinstance(other, ProjectList):
             return False
@@ -48,9 +208,20 @@ class ProjectList(object):
 
     def __getitem__(self, file_number):
         if file_number not in self._projects:
-            with open(self.filename, 'rb') as fp:
+            if self.block_index.size_blks(file_number) == 0:
+                # If a given file number doesn't have any blocks, it doesn't
+                # exist
+                self._projects[file_number] = None
+            elif self._closed:
+                raise ValueError("Can't load project %d; its file has been "
+                                 "closed" % (file_number))
+            elif self._file_data is not None:
                 self._projects[file_number] = self._read_project(
-                    fp, file_number)
+                    None, file_number)
+            else:
+                with open(self.filename, 'rb') as fp:
+                    self._projects[file_number] = self._read_project(
+                        fp, file_number)
 
         return self._projects[file_number]
 
@@ -60,48 +231,111 @@ class ProjectList(object):
     def keys(self):
         return range(NUM_FILES)
 
-    def _read_project(self, fp, file_number):
-        # Scan the block allocation table for blocks for this project
-        # Block 0 is reserved, so block numbers are assumed off-by-one
-        block_numbers = [
-            block_number + 1 for block_number, blk_file in
-            enumerate(self.header_block.block_alloc_table)
-            if blk_file == file_number
-        ]
+    def _read_blocks(self, fp, file_number):
+        block_numbers = self.block_index.blocks(file_number)
 
-        project_size_blks = len(block_numbers)
+        if self._file_data is not None:
+            # Blocks are copied out of the mapping as decompression reaches
+            # them
+            block_map = blockutils.BlockBufferMap(
+                self._file_data, block_numbers, BLOCKS_START_OFFSET)
+            self._block_maps.append(block_map)
 
-        # If a given file number doesn't have any blocks, it doesn't exist
-        if project_size_blks == 0:
-            return None
+            return block_map
 
-        block_map = {}
+        # The file is closed (and may even be overwritten) long before the
+        # project is decompressed, so its blocks are read now
+        return blockutils.read_blocks(fp, block_numbers, BLOCKS_START_OFFSET)
 
-        for block_number in block_numbers:
-            offset = BLOCKS_START_OFFSET + \
-                     (block_number * blockutils.BLOCK_SIZE)
+    def _read_project(self, fp, file_number):
+        blocks = self._read_blocks(fp, file_number)
 
-            fp.seek(offset, os.SEEK_SET)
+        # The project's song is decompressed when it's first needed
+        project = Project(
+            name=self.header_block.filenames[file_number],
+            version=self.header_block.file_versions[file_number],
+            data=None,
+            size_blks=len(blocks),
+            blocks=blocks,
+            cache=self._cache)
 
-            block_data = bytearray(fp.read(blockutils.BLOCK_SIZE))
+        return project
 
-            block_map[block_number] = blockutils.Block(
-                block_number, block_data)
+    def load_all(self, executor=None):
+        """Load and decompress every project that hasn't been loaded yet.
 
-        reader = BlockReader()
-        compressed_data = reader.read(block_map)
-        raw_data = filepack.decompress(compressed_data)
+        :param executor: a ``concurrent.futures.Executor`` in which to
+          decompress the projects, or None to decompress them one by one in
+          this process
+        """
+        file_numbers = []
 
-        project_name = self.header_block.filenames[file_number]
-        project_version = self.header_block.file_versions[file_number]
+        for file_number in range(NUM_FILES):
+            if file_number in self._projects:
+                continue
 
-        project = Project(
-            name=self.header_block.filenames[file_number],
-            version=self.header_block.file_versions[file_number],
-            data=raw_data,
-            size_blks=project_size_blks)
+            if self.block_index.size_blks(file_number) == 0:
+                self._projects[file_number] = None
+            else:
+                file_numbers.append(file_number)
 
-        return project
+        if self._file_data is not None:
+            block_maps = dict(
+                (file_number, self._read_blocks(None, file_number))
+                for file_number in file_numbers)
+        else:
+            with open(self.filename, 'rb') as fp:
+                block_maps = dict(
+                    (file_number, self._read_blocks(fp, file_number))
+                    for file_number in file_numbers)
+
+        raw_data = {}
+        cache_keys = {}
+
+        if self._cache is not None:
+            for file_number in file_numbers:
+                cache_keys[file_number] = self._cache.key(
+                    block_maps[file_number])
+
+                cached_raw_data = self._cache.get(cache_keys[file_number])
+
+                if cached_raw_data is not None:
+                    raw_data[file_number] = cached_raw_data
+
+        to_decompress = [file_number for file_number in file_numbers
+                         if file_number not in raw_data]
+
+        # Only the blocks' bytes are sent to the workers
+        block_data = dict(
+            (file_number, dict(
+                (block_number, bytes(block_maps[file_number][block_number].data))
+                for block_number in block_maps[file_number].keys()))
+            for file_number in to_decompress)
+
+        if executor is None:
+            for file_number in to_decompress:
+                raw_data[file_number] = _decompress_block_data(
+                    block_data[file_number])
+        else:
+            futures = dict(
+                (file_number, executor.submit(
+                    _decompress_block_data, block_data[file_number]))
+                for file_number in to_decompress)
+
+            for file_number, future in futures.items():
+                raw_data[file_number] = future.result()
+
+        if self._cache is not None:
+            for file_number in to_decompress:
+                self._cache.put(cache_keys[file_number], raw_data[file_number])
+
+        for file_number in file_numbers:
+            self._projects[file_number] = Project(
+                name=self.header_block.filenames[file_number],
+                version=self.header_block.file_versions[file_number],
+                data=raw_data[file_number],
+                size_blks=len(block_maps[file_number]),
+                blocks=block_maps[file_number])
 
 class SAVFile(object):
     # Start offset of SAV file contents
@@ -131,18 +365,111 @@ class SAVFile(object):
     # Length in bytes of file number
     FILE_NUMBER_LENGTH = 1
 
-    def __init__(self, filename, callback=_noop_callback):
+    # Ways to load projects when the file is opened; see __init__
+    PRELOAD_MODES = (None, "serial", "parallel")
+
+    def __init__(self, filename, callback=_noop_callback, mmap=False,
+                 preload=None, workers=None, cache=None, validate=False):
         """Constructor.
 
         :param filename: the file to open
         :type name: str
         :param callback: a progress callback function
         :type name: function
+        :param mmap: if True, map the file into memory once and read projects'
+          blocks directly from the mapping, rather than opening and reading
+          the file every time a project is loaded. The mapping stays open
+          until :py:meth:`close` is called.
+        :type mmap: bool
+        :param preload: if ``"serial"`` or ``"parallel"``, load and decompress
+          every project right away (see :py:meth:`load_all`), in this process
+          or in a pool of worker processes respectively; if None, projects
+          are loaded when they're first accessed
+        :type preload: str
+        :param workers: the number of worker processes to use if ``preload``
+          is ``"parallel"``; defaults to the number of CPUs
+        :type workers: int
+        :param cache: a cache from which to fetch (and in which to store) the
+          file's decompressed songs
+        :type cache: :py:class:`pylsdj.cache.ProjectCache`
+        :param validate: if True, check the parsed header block against the
+          one that bread parses from the same data
+        :type validate: bool
         """
+        if preload not in self.PRELOAD_MODES:
+            raise ValueError("Unknown preload mode '%s'" % (preload))
+
         self.filename = filename
+        self._cache = cache
+        self._validate = validate
+
+        # The memory mapping of the file, if it's mapped
+        self._file_map = None
 
         with open(filename, 'rb') as fp:
-            self._load(fp, callback)
+            if mmap:
+                self._file_map = _map_file(fp)
+
+                try:
+                    self._load(self._file_map, callback)
+                except Exception:
+                    # Don't leave the file mapped if it can't be loaded
+                    self._file_map.close()
+                    self._file_map = None
+                    raise
+            else:
+                self._load(fp, callback)
+
+        try:
+            if preload == "serial":
+                self.load_all()
+            elif preload == "parallel":
+                with utils.process_pool(workers) as executor:
+                    self.load_all(executor=executor)
+        except Exception:
+            self.close()
+            raise
+
+    def close(self):
+        """Release the file's memory mapping, if it has one. Projects that
+        have already been loaded keep working, but projects that haven't been
+        loaded yet can't be loaded after the file is closed (doing so raises a
+        ValueError), so load any that are needed first. Files that aren't
+        mapped hold nothing open, so closing them does nothing.
+
+        A SAVFile can also be used as a context manager, which closes it when
+        the block exits.
+        """
+        if self._file_map is None:
+            return
+
+        self.projects.close()
+        self._file_map.close()
+        self._file_map = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, t, value, traceback):
+        self.close()
+
+    def load_all(self, executor=None, workers=None):
+        """Load and decompress all of the file's projects at once, rather than
+        as they're accessed. Projects that have already been loaded are left
+        alone.
+
+        :param executor: a ``concurrent.futures.Executor`` (usually a
+          ``ProcessPoolExecutor``) across which to spread the work of
+          decompressing the projects
+        :param workers: if ``executor`` isn't provided, decompress the
+          projects in a new pool of this many worker processes; if neither
+          is provided, decompress the projects one by one in this process
+        """
+        if executor is None and workers is not None:
+            with utils.process_pool(workers) as executor:
+                self.projects.load_all(executor)
+        else:
+            self.projects.load_all(executor)
 
     def _load(self, fp, callback):
         # read preamble + decompress blocks + "all done"
@@ -155,11 +482,8 @@ class SAVFile(object):
 
         header_block_data = fp.read(blockutils.BLOCK_SIZE)
 
-        try:
-            self.header_block = bread.parse(
-                header_block_data, bread_spec.compressed_sav_file)
-        except bitstring.ReadError as e:
-            raise exceptions.ImportException(e)
+        self.header_block = headers.read_sav_header(
+            header_block_data, validate=self._validate)
 
         if self.header_block.sram_init_check != b'jk':
             error_msg = (
@@ -175,7 +499,23 @@ class SAVFile(object):
 
         callback("Decompressing", current_step, total_steps, True)
 
-        self.projects = ProjectList(self.filename, self.header_block)
+        file_data = None
+
+        if self._file_map is not None:
+            if six.PY2:
+                # Python 2's mmaps don't support memoryviews, but slicing
+                # them copies just the slice, which is all that's needed
+                file_data = self._file_map
+            else:
+                file_data = memoryview(self._file_map)
+
+        self.block_index = BlockIndex(self.header_block.block_alloc_table)
+        """a :py:class:`BlockIndex` of the blocks in the file as it was
+        loaded"""
+
+        self.projects = ProjectList(
+            self.filename, self.header_block, self.block_index, file_data,
+            self._cache)
 
         current_step += 1
 
@@ -209,19 +549,58 @@ class SAVFile(object):
         .sav file contains"""
         return [(i, self.projects[i]) for i in sorted(self.projects.keys())]
 
-    def _save(self, fp, callback):
+    def _compress_projects(self, executor):
+        # Compress every project that can't reuse its original blocks, spread
+        # across the executor's workers
+        raw_data = {}
+
+        for i in range(NUM_FILES):
+            project = self.projects[i]
+
+            if project is not None and project._original_blocks() is None:
+                raw_data[i] = bytes(project.get_raw_data())
+
+        futures = dict(
+            (i, executor.submit(filepack.compress_bytes, data))
+            for i, data in raw_data.items())
+
+        return dict((i, future.result()) for i, future in futures.items())
+
+    def _save(self, open_file, callback, executor=None):
+        # The whole file is assembled before open_file is called to open the
+        # file it's written to, so that every project's blocks have been read
+        # (and copied) by the time that file is truncated, even when it's the
+        # file being saved
+
         # Marshal 32 possible projects + write preamble + write data + "all
         # done"
         total_steps = 35
         current_step = 0
 
+        # Compression is the only expensive part of marshaling a project, and
+        # each project is compressed independently of the others. If we have
+        # an executor, compress them all at once; blocks still have to be
+        # assigned to projects one at a time
+        if executor is not None:
+            compressed_projects = self._compress_projects(executor)
+        else:
+            compressed_projects = {}
+
         writer = BlockWriter()
-        factory = BlockFactory()
 
         # Block allocation table doesn't include header block because it's
         # always in use, so have to add additional block to account for header
         num_blocks = self.BAT_END_OFFSET - self.BAT_START_OFFSET + 2
 
+        # The whole file is assembled in one buffer, so that it can be written
+        # with a single call. Blocks are written straight into the buffer;
+        # unused blocks are left zeroed.
+        file_data = bytearray(self.START_OFFSET + num_blocks *
+                              blockutils.BLOCK_SIZE)
+        file_data[:len(self.preamble)] = self.preamble
+
+        factory = BlockFactory(num_blocks, file_data, self.START_OFFSET)
+
         header_block = factory.new_block()
 
         block_table = []
@@ -245,10 +624,20 @@ class SAVFile(object):
                      (utils.name_without_zeroes(project.name)),
                      current_step - 1, total_steps, True)
 
-            raw_data = project.get_raw_data()
-            compressed_data = filepack.compress(raw_data)
+            # Projects that haven't changed since they were loaded don't need
+            # to be compressed again; their blocks can be copied as they are
+            original_blocks = project._original_blocks()
 
-            project_block_ids = writer.write(compressed_data, factory)
+            if original_blocks is None:
+                if i in compressed_projects:
+                    compressed_data = compressed_projects[i]
+                else:
+                    raw_data = project.get_raw_data()
+                    compressed_data = filepack.compress_bytes(raw_data)
+
+                project_block_ids = writer.write(compressed_data, factory)
+            else:
+                project_block_ids = writer.copy(original_blocks, factory)
 
             for b in project_block_ids:
                 block_table[b] = i
@@ -256,9 +645,6 @@ class SAVFile(object):
         callback("Writing preamble and constructing header block",
                  current_step, total_steps, True)
         current_step += 1
-        # Bytes up to START_OFFSET will remain the same
-        fp.write(self.preamble)
-
         # Set header block filenames and versions
 
         empty_project_name = '\0' * self.FILENAME_LENGTH
@@ -284,41 +670,57 @@ class SAVFile(object):
 
             self.header_block.block_alloc_table[i] = file_no
 
-        header_block.data = bread.write(
-            self.header_block, bread_spec.compressed_sav_file)
+        header_data = headers.write_sav_header(self.header_block)
 
-        assert len(header_block.data) == blockutils.BLOCK_SIZE, \
+        assert len(header_data) == blockutils.BLOCK_SIZE, \
             "Header block isn't the expected length; expected 0x%x, got 0x%x" \
-            % (blockutils.BLOCK_SIZE, len(header_block.data))
-
-        block_map = factory.blocks
+            % (blockutils.BLOCK_SIZE, len(header_data))
 
-        empty_block_data = []
-        for i in range(blockutils.BLOCK_SIZE):
-            empty_block_data.append(0)
+        header_block.data[:] = header_data
 
         callback("Writing data to file", current_step, total_steps, True)
         current_step += 1
-        for i in range(num_blocks):
-            if i in block_map:
-                data_list = block_map[i].data
-            else:
-                data_list = empty_block_data
 
-            fp.write(bytearray(data_list))
+        with open_file() as fp:
+            fp.write(factory.buffer)
 
         callback("Save complete!", total_steps, total_steps, True)
 
-    def save(self, filename, callback=_noop_callback):
+    def save(self, filename, callback=_noop_callback, workers=None,
+             atomic=False):
         """Save this file.
 
         :param filename: the file to which to save the .sav file
         :type filename: str
         :param callback: a progress callback function
         :type callback: function
+        :param workers: if provided, compress the projects that need
+          compressing in a pool of this many worker processes. The file that's
+          written is the same either way.
+        :type workers: int
+        :param atomic: if True, write the file under a temporary name and
+          rename it into place once it's complete, so that ``filename`` is
+          never left partially written
+        :type atomic: bool
         """
-        with open(filename, 'wb') as fp:
-            self._save(fp, callback)
+        if workers is not None:
+            with utils.process_pool(workers) as executor:
+                self._save_to(filename, callback, executor, atomic)
+        else:
+            self._save_to(filename, callback, None, atomic)
+
+    def _save_to(self, filename, callback, executor, atomic):
+        # Truncating a file that's mapped into memory would pull the blocks
+        # we're about to copy out from under us, so in that case we always
+        # write a new file and move it into place
+        if (self._file_map is not None and os.path.exists(filename) and
+                os.path.samefile(filename, self.filename)):
+            atomic = True
+
+        if atomic:
+            self._save(lambda: utils.atomic_file(filename), callback, executor)
+        else:
+            self._save(lambda: open(filename, 'wb'), callback, executor)
 
 if __name__ == "__main__":
     sav = SAVFile(sys.argv[1])
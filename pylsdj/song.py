@@ -14,6 +14,8 @@ from .filepack import DEFAULT_INSTRUMENT
 
 from .clock import Clock, TotalClock
 
+from .arrays import SongArrays
+
 from .exceptions import ImportException
 
 from .vendor.six.moves import range
@@ -27,10 +29,17 @@ class AllocTable(object):
     def __init__(self, song, alloc_table, object_class):
         self.alloc_table = alloc_table
 
-        self.access_objects = []
+        self._song = song
+        self._object_class = object_class
+
+        # Access objects are created the first time they're needed
+        self.access_objects = [None] * len(alloc_table)
+
+    def _access_object(self, index):
+        if self.access_objects[index] is None:
+            self.access_objects[index] = self._object_class(self._song, index)
 
-        for index in range(len(alloc_table)):
-            self.access_objects.append(object_class(song, index))
+        return self.access_objects[index]
 
     def __getitem__(self, index):
         assert_index_sane(index, len(self.alloc_table))
@@ -38,7 +47,7 @@ class AllocTable(object):
         if not self.alloc_table[index]:
             return None
 
-        return self.access_objects[index]
+        return self._access_object(index)
 
     def allocate(self, index):
         self.alloc_table[index] = True
@@ -73,7 +82,7 @@ class AllocTable(object):
             if not self.alloc_table[i]:
                 l.append(None)
             else:
-                l.append(self.access_objects[i])
+                l.append(self._access_object(i))
 
         return l
 
@@ -170,18 +179,20 @@ class Synths(object):
 
     def __init__(self, song):
         self.song = song
-        self.access_objects = []
 
-        for index in range(bread_spec.NUM_SYNTHS):
-            self.access_objects.append(Synth(self.song, index))
+        # Access objects are created the first time they're needed
+        self.access_objects = [None] * bread_spec.NUM_SYNTHS
 
     def __getitem__(self, index):
         assert_index_sane(index, bread_spec.NUM_SYNTHS)
 
+        if self.access_objects[index] is None:
+            self.access_objects[index] = Synth(self.song, index)
+
         return self.access_objects[index]
 
     def as_list(self):
-        return self.access_objects
+        return [self[index] for index in range(bread_spec.NUM_SYNTHS)]
 
 
 class Song(object):
@@ -196,8 +207,10 @@ class Song(object):
         assert song_data.mem_init_flag_3 == b'rb'
 
         # Everything we do to the song or any of its components should update
-        # the song data object, so that we can rely on bread's writer to write
-        # it back out in the right format
+        # the song data object, so that the song's raw data can be written
+        # back out in the right format. song_data is usually a
+        # pylsdj.views.SongData, which makes those updates to the raw data
+        # directly, but a song parsed by bread works just as well
         self.song_data = song_data
 
         self._grooves = Grooves(self)
@@ -292,6 +305,29 @@ class Song(object):
         """the song's table of macro tables, represented as Table objects"""
         return self._tables
 
+    def as_arrays(self):
+        """Get NumPy arrays over the song's tables, for reading and editing
+        whole tables at once. Requires NumPy.
+
+        :rtype: :py:class:`pylsdj.arrays.SongArrays`
+        """
+        raw_data = getattr(self.song_data, 'raw_data', None)
+
+        if not isinstance(raw_data, bytearray):
+            raise ValueError("Arrays can only be created for songs whose "
+                             "data is a view of raw data")
+
+        return SongArrays(raw_data)
+
+def _song_data_property(field, doc):
+    def field_getter(this):
+        return getattr(this.song_data, field)
+
+    def field_setter(this, value):
+        setattr(this.song_data, field, value)
+
+    return property(fset=field_setter, fget=field_getter, doc=doc)
+
 # For fields with a one-to-one correspondence with song data, we'll
 # programmatically insert properties to avoid repetition
 for field, doc in [("tempo", "the song's tempo"),
@@ -313,11 +349,4 @@ for field, doc in [("tempo", "the song's tempo"),
                     "while entering them"),
                    ("bookmarks", "list of screen bookmarks"),
                    ("wave_synth_overwrite_locks", None)]:
-    def field_getter(this):
-        return getattr(this.song_data, field)
-
-    def field_setter(this, value):
-        setattr(this.song_data, field, value)
-
-    setattr(Song, field, property(fset=field_setter, fget=field_getter,
-                                  doc=doc))
+    setattr(Song, field, _song_data_property(field, doc))
@@ -1,6 +1,10 @@
 import json
 
-from .bread_spec import NUM_SYNTHS, WAVES_PER_SYNTH
+from . import layout
+from .bread_spec import NUM_SYNTHS, WAVES_PER_SYNTH, FRAMES_PER_WAVE
+from .nibbles import pack_nibbles, unpack_nibbles
+
+_WAVE_FRAMES_LAYOUT = layout.SONG_LAYOUT['wave_frames']
 
 class WaveSynthOverwriteLock(object):
     def __init__(self, song, index):
@@ -77,11 +81,52 @@ class WaveFrames(object):
         self._frames = song.song_data.wave_frames[synth_index][wave_index]
         self._overwrite_lock = overwrite_lock
 
+        # If the song is a view of raw data, whole waves are read and written
+        # as packed nibbles rather than a frame at a time
+        self._raw_data = getattr(song.song_data, 'raw_data', None)
+
+        if self._raw_data is not None:
+            self._start = layout.byte_offset(
+                _WAVE_FRAMES_LAYOUT, synth_index, wave_index)
+            self._stop = self._start + FRAMES_PER_WAVE // 2
+
+    def _get_all(self):
+        if self._raw_data is None:
+            return list(self._frames)
+
+        return list(unpack_nibbles(self._raw_data[self._start:self._stop]))
+
+    def _set_all(self, frames):
+        if len(frames) != FRAMES_PER_WAVE:
+            raise ValueError("A wave has %d frames, but got %d" %
+                             (FRAMES_PER_WAVE, len(frames)))
+
+        if self._raw_data is None:
+            for i, frame in enumerate(frames):
+                self._frames[i] = frame
+        else:
+            self._raw_data[self._start:self._stop] = pack_nibbles(frames)
+
+    def __len__(self):
+        return FRAMES_PER_WAVE
+
+    def __iter__(self):
+        return iter(self._get_all())
+
     def __getitem__(self, index):
+        if type(index) is slice:
+            return self._get_all()[index]
+
         return self._frames[index]
 
     def __setitem__(self, index, value):
-        self._frames[index] = value
+        if type(index) is slice:
+            frames = self._get_all()
+            frames[index] = value
+            self._set_all(frames)
+        else:
+            self._frames[index] = value
+
         self._overwrite_lock.enable()
 
 class Waves(object):
@@ -92,6 +137,12 @@ class Waves(object):
     def __getitem__(self, index):
         return self._waves[index]
 
+    def __setitem__(self, index, frames):
+        self._waves[index][:] = frames
+
+    def __len__(self):
+        return WAVES_PER_SYNTH
+
 class Synth(object):
 
     def __init__(self, song, index):
@@ -224,5 +275,4 @@ class Synth(object):
                 setattr(self, key, value)
 
         for i, wave in enumerate(synth_data['waves']):
-            for j, frame in enumerate(wave):
-                self.waves[i][j] = frame
+            self.waves[i] = wave
@@ -0,0 +1,102 @@
+import os
+import sys
+import unittest
+from nose.tools import assert_equal, raises
+
+SCRIPT_DIR = os.path.abspath(os.path.dirname(__file__))
+
+sys.path.append(os.path.join(SCRIPT_DIR, os.path.pardir))
+
+try:
+    import numpy
+except ImportError:
+    raise unittest.SkipTest("NumPy isn't installed")
+
+from .project import load_lsdsng
+
+
+def _load_sample_song():
+    return load_lsdsng(
+        os.path.join(SCRIPT_DIR, "test_data", "UNTOLDST.lsdsng")).song
+
+
+def test_byte_tables_are_views():
+    song = _load_sample_song()
+    song_data = song.song_data
+    arrays = song.as_arrays()
+
+    assert_equal(arrays['phrase_instruments'].shape, (255, 16))
+    assert_equal(arrays['phrase_instruments'][17].tolist(),
+                 list(song_data.phrase_instruments[17]))
+    assert_equal(arrays['chain_transposes'][3].tolist(),
+                 list(song_data.chain_transposes[3]))
+    assert_equal(arrays['table_cmd2.val'][5].tolist(),
+                 list(song_data.table_cmd2.val[5]))
+    assert_equal(arrays['song'][2].tolist(),
+                 [song_data.song[2].pu1, song_data.song[2].pu2,
+                  song_data.song[2].wav, song_data.song[2].noi])
+
+    arrays['chain_phrases'][10, 4] = 0x42
+    arrays['song'][7, 2] = 0x13
+
+    assert_equal(song_data.chain_phrases[10][4], 0x42)
+    assert_equal(song_data.song[7].wav, 0x13)
+
+
+def test_packed_tables():
+    song = _load_sample_song()
+    song_data = song.song_data
+
+    with song.as_arrays() as arrays:
+        wave_frames = arrays['wave_frames']
+        phrase_alloc_table = arrays['phrase_alloc_table']
+
+        assert_equal(wave_frames.shape, (16, 16, 32))
+        assert_equal(wave_frames[2, 3].tolist(),
+                     list(song_data.wave_frames[2][3]))
+        assert_equal(phrase_alloc_table.tolist(),
+                     [int(allocated) for allocated
+                      in song_data.phrase_alloc_table])
+
+        wave_frames[2, 3, :] = 0xa
+        phrase_alloc_table[254] = 1 - phrase_alloc_table[254]
+
+    assert_equal(list(song_data.wave_frames[2][3]), [0xa] * 32)
+    assert_equal(song_data.phrase_alloc_table[254],
+                 bool(phrase_alloc_table[254]))
+
+    # Writing back unchanged tables doesn't change the song
+    before = bytes(song_data.raw_data)
+    song.as_arrays().write_back()
+    assert_equal(bytes(song_data.raw_data), before)
+
+
+def test_write_back_keeps_song_changes():
+    song = _load_sample_song()
+    song_data = song.song_data
+
+    allocated = song_data.phrase_alloc_table[3]
+
+    with song.as_arrays() as arrays:
+        # Changes made through the song while the arrays are open, including
+        # to tables that are also changed through the arrays
+        song_data.phrase_alloc_table[3] = not allocated
+        song.synths[0].waves[0][0] = 5
+
+        phrase_alloc_table = arrays['phrase_alloc_table']
+
+        arrays['wave_frames'][2, 3, :] = 0xa
+        phrase_alloc_table[254] = 1 - phrase_alloc_table[254]
+
+    assert_equal(song_data.phrase_alloc_table[3], not allocated)
+    assert_equal(song.synths[0].waves[0][0], 5)
+    assert_equal(list(song_data.wave_frames[2][3]), [0xa] * 32)
+    assert_equal(song_data.phrase_alloc_table[254],
+                 bool(phrase_alloc_table[254]))
+
+
+@raises(ValueError)
+def test_value_too_large():
+    arrays = _load_sample_song().as_arrays()
+    arrays['wave_frames'][0, 0, 0] = 0x10
+    arrays.write_back()
@@ -1,7 +1,8 @@
 import os
 import sys
 import json
-from nose.tools import assert_equal, assert_list_equal
+import tempfile
+from nose.tools import assert_equal, assert_list_equal, raises
 from .vendor.six.moves import range
 
 SCRIPT_DIR = os.path.abspath(os.path.dirname(__file__))
@@ -71,3 +72,72 @@ def test_sample_file():
     assembled_from_write = reader.read(block_map)
 
     assert_equal(assembled_from_write, compressed)
+
+
+def test_read_blocks():
+    data = bytearray(i % 256 for i in range(bl.BLOCK_SIZE * 4))
+
+    with tempfile.TemporaryFile() as fp:
+        fp.write(b'header')
+        fp.write(data)
+
+        blocks = bl.read_blocks(fp, [3, 1], len(b'header'))
+
+        assert_equal(sorted(blocks.keys()), [1, 3])
+        assert_equal(blocks[3].id, 3)
+        assert_equal(blocks[3].data,
+                     data[3 * bl.BLOCK_SIZE:4 * bl.BLOCK_SIZE])
+        assert_equal(blocks[1].data,
+                     data[bl.BLOCK_SIZE:2 * bl.BLOCK_SIZE])
+
+
+def test_block_buffer_map():
+    data = bytearray(i % 256 for i in range(bl.BLOCK_SIZE * 4))
+    buf = memoryview(bytes(b'header' + data))
+
+    block_map = bl.BlockBufferMap(buf, [1, 3], len(b'header'))
+
+    assert_equal(sorted(block_map.keys()), [1, 3])
+    assert_equal(block_map[3].id, 3)
+    assert_equal(bytearray(block_map[3].data),
+                 data[3 * bl.BLOCK_SIZE:4 * bl.BLOCK_SIZE])
+    assert_equal(bytearray(block_map[1].data),
+                 data[bl.BLOCK_SIZE:2 * bl.BLOCK_SIZE])
+    assert 2 not in block_map
+
+    # Once detached, the map no longer needs the buffer
+    block_map.detach()
+
+    if hasattr(buf, 'release'):
+        buf.release()
+
+    assert_equal(bytearray(block_map[3].data),
+                 data[3 * bl.BLOCK_SIZE:4 * bl.BLOCK_SIZE])
+
+
+def test_factory_blocks_share_buffer():
+    buf = bytearray(b'\xff' * (bl.BLOCK_SIZE * 3 + 4))
+    factory = bl.BlockFactory(3, buf, 4)
+
+    for i in range(3):
+        block = factory.new_block()
+        assert_equal(bytes(block.data), b'\0' * bl.BLOCK_SIZE)
+
+    factory.blocks[1].data[0:2] = b'hi'
+
+    assert factory.buffer is buf
+    assert_equal(buf[:4], bytearray(b'\xff' * 4))
+    assert_equal(buf[4 + bl.BLOCK_SIZE:6 + bl.BLOCK_SIZE], bytearray(b'hi'))
+
+
+@raises(AssertionError)
+def test_factory_runs_out_of_blocks():
+    factory = bl.BlockFactory(2)
+
+    for i in range(3):
+        factory.new_block()
+
+
+@raises(ValueError)
+def test_factory_buffer_too_small():
+    bl.BlockFactory(3, bytearray(bl.BLOCK_SIZE * 3), 1)
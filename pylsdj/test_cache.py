@@ -0,0 +1,146 @@
+import os
+import shutil
+import sys
+import tempfile
+from nose.tools import assert_equal, assert_is_none, raises
+
+SCRIPT_DIR = os.path.abspath(os.path.dirname(__file__))
+
+sys.path.append(os.path.join(SCRIPT_DIR, os.path.pardir))
+
+from .blockutils import Block
+from .cache import ProjectCache
+from .project import load_lsdsng
+from .savfile import SAVFile
+from . import filepack
+from .consts import RAW_DATA_SIZE
+
+SAV_IN = os.path.join(SCRIPT_DIR, "test_data", "lsdj.sav")
+LSDSNG_IN = os.path.join(SCRIPT_DIR, "test_data", "UNTOLDST.lsdsng")
+
+
+def _num_projects(sav):
+    return len(sav.block_index.file_numbers())
+
+
+def test_load_sav_twice():
+    cache = ProjectCache()
+
+    first = SAVFile(SAV_IN, cache=cache)
+    first.load_all()
+
+    num_projects = _num_projects(first)
+    assert_equal(cache.hits, 0)
+    assert_equal(cache.misses, num_projects)
+
+    second = SAVFile(SAV_IN, cache=cache)
+
+    for file_number in second.block_index.file_numbers():
+        assert_equal(second.projects[file_number].get_raw_data(),
+                     first.projects[file_number].get_raw_data())
+
+    assert_equal(cache.hits, num_projects)
+    assert_equal(cache.misses, num_projects)
+
+
+def test_cached_data_is_copied():
+    cache = ProjectCache()
+
+    first = load_lsdsng(LSDSNG_IN, cache=cache)
+    first.song.tempo += 1
+
+    second = load_lsdsng(LSDSNG_IN, cache=cache)
+
+    assert_equal(second.song.tempo, first.song.tempo - 1)
+    assert_equal(cache.hits, 1)
+
+
+def test_key_ignores_block_numbers():
+    cache = ProjectCache()
+
+    blocks = load_lsdsng(LSDSNG_IN)._blocks
+    chain = filepack.block_chain(blocks)
+    block_ids = [block_id + 10 for block_id in sorted(blocks.keys())]
+
+    moved_blocks = dict(
+        (block_id, Block(block_id, data)) for block_id, data in zip(
+            block_ids, filepack.renumber_block_switches(
+                [block.data for block in chain], block_ids)))
+
+    assert_equal(cache.key(blocks), cache.key(moved_blocks))
+
+
+def _song(fill):
+    return fill * RAW_DATA_SIZE
+
+
+def test_eviction():
+    cache = ProjectCache(max_entries=2)
+
+    cache.put('a', _song(b'a'))
+    cache.put('b', _song(b'b'))
+    cache.get('a')
+    cache.put('c', _song(b'c'))
+
+    assert_equal(len(cache), 2)
+    assert_is_none(cache.get('b'))
+    assert_equal(cache.get('a'), bytearray(_song(b'a')))
+    assert_equal(cache.get('c'), bytearray(_song(b'c')))
+
+
+def test_only_songs_cached():
+    directory = tempfile.mkdtemp()
+
+    try:
+        cache = ProjectCache(directory=directory)
+        cache.put('a', b'a')
+
+        assert_equal(len(cache), 0)
+        assert_equal(os.listdir(directory), [])
+        assert_is_none(cache.get('a'))
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_directory_eviction():
+    directory = tempfile.mkdtemp()
+
+    try:
+        cache = ProjectCache(max_entries=1, directory=directory,
+                             max_stored_entries=2)
+
+        cache.put('a', _song(b'a'))
+        cache.put('b', _song(b'b'))
+
+        # Make 'a' the least recently used stored entry, then use it
+        os.utime(os.path.join(directory, 'a.raw'), (0, 0))
+        os.utime(os.path.join(directory, 'b.raw'), (1, 1))
+        assert_equal(cache.get('a'), bytearray(_song(b'a')))
+
+        cache.put('c', _song(b'c'))
+
+        assert_equal(sorted(os.listdir(directory)), ['a.raw', 'c.raw'])
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_directory():
+    directory = tempfile.mkdtemp()
+
+    try:
+        raw_data = load_lsdsng(
+            LSDSNG_IN, cache=ProjectCache(directory=directory)).get_raw_data()
+
+        cache = ProjectCache(directory=directory)
+        proj = load_lsdsng(LSDSNG_IN, cache=cache)
+
+        assert_equal(proj.get_raw_data(), raw_data)
+        assert_equal(cache.hits, 1)
+        assert_equal(cache.misses, 0)
+    finally:
+        shutil.rmtree(directory)
+
+
+@raises(ValueError)
+def test_empty_cache():
+    ProjectCache(max_entries=0)
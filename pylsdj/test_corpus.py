@@ -0,0 +1,110 @@
+import os
+import shutil
+import sys
+import tempfile
+from nose.tools import assert_equal, assert_true
+
+SCRIPT_DIR = os.path.abspath(os.path.dirname(__file__))
+
+sys.path.append(os.path.join(SCRIPT_DIR, os.path.pardir))
+
+from . import corpus
+from . import exceptions
+from .project import load_lsdsng, load_srm
+from .savfile import SAVFile
+
+
+def _make_corpus():
+    root = tempfile.mkdtemp()
+    test_data = os.path.join(SCRIPT_DIR, "test_data")
+
+    os.mkdir(os.path.join(root, "uploads"))
+
+    shutil.copy(os.path.join(test_data, "lsdj.sav"), root)
+    shutil.copy(os.path.join(test_data, "UNTOLDST.lsdsng"),
+                os.path.join(root, "uploads"))
+    shutil.copy(os.path.join(test_data, "sample.srm"),
+                os.path.join(root, "uploads"))
+    shutil.copy(os.path.join(test_data, "KI.lsdinst"), root)
+
+    # Not a real .sav file
+    with open(os.path.join(root, "uploads", "broken.sav"), 'wb') as fp:
+        fp.write(b'\0' * 1024)
+
+    return root
+
+
+def _check_corpus(workers):
+    root = _make_corpus()
+
+    try:
+        errors = []
+        records = list(corpus.load_corpus(root, workers=workers,
+                                          errors=errors))
+
+        sav_path = os.path.join(root, "lsdj.sav")
+        lsdsng_path = os.path.join(root, "uploads", "UNTOLDST.lsdsng")
+        srm_path = os.path.join(root, "uploads", "sample.srm")
+
+        sav = SAVFile(sav_path)
+        expected = [(sav_path, file_number, project)
+                    for file_number, project in sav.project_list
+                    if project is not None]
+        expected.append((lsdsng_path, None, load_lsdsng(lsdsng_path)))
+        expected.append((srm_path, None, load_srm(srm_path)))
+
+        assert_equal([(path, file_number)
+                      for path, file_number, project in records],
+                     [(path, file_number)
+                      for path, file_number, project in expected])
+
+        for (_, _, project), (_, _, expected_project) in zip(
+                records, expected):
+            assert_equal(project.name, expected_project.name)
+            assert_equal(project, expected_project)
+
+        assert_equal(len(errors), 1)
+        assert_equal(errors[0][0],
+                     os.path.join(root, "uploads", "broken.sav"))
+        assert_true(isinstance(errors[0][1], exceptions.ImportException))
+    finally:
+        shutil.rmtree(root)
+
+
+def test_load_corpus():
+    _check_corpus(workers=None)
+
+
+def test_load_corpus_in_parallel():
+    _check_corpus(workers=2)
+
+
+
+def _check_corpus_error_records(workers):
+    root = _make_corpus()
+
+    try:
+        records = list(corpus.load_corpus(root, workers=workers))
+
+        broken_path = os.path.join(root, "uploads", "broken.sav")
+        error_records = [record for record in records
+                         if record[0] == broken_path]
+
+        assert_equal(len(error_records), 1)
+        assert_equal(error_records[0][1], None)
+        assert_true(isinstance(error_records[0][2],
+                               exceptions.ImportException))
+
+        # The other files are still loaded
+        assert_equal(len(records),
+                     len(list(corpus.load_corpus(root, errors=[]))) + 1)
+    finally:
+        shutil.rmtree(root)
+
+
+def test_load_corpus_yields_errors_by_default():
+    _check_corpus_error_records(workers=None)
+
+
+def test_load_corpus_in_parallel_yields_errors_by_default():
+    _check_corpus_error_records(workers=2)
@@ -1,7 +1,8 @@
 import os
 import sys
 import json
-from nose.tools import raises, assert_equal, assert_list_equal
+from nose.tools import raises, assert_equal, assert_list_equal, \
+    assert_less_equal
 from .vendor.six.moves import range
 
 SCRIPT_DIR = os.path.abspath(os.path.dirname(__file__))
@@ -213,9 +214,9 @@ def test_special_byte_on_block_boundary():
     block_2_expected = [36, filepack.SPECIAL_BYTE, filepack.EOF_BYTE, 0, 0]
 
     assert_equal(len(factory.blocks), 3)
-    assert_list_equal(factory.blocks[0].data, block_0_expected)
-    assert_list_equal(factory.blocks[1].data, block_1_expected)
-    assert_list_equal(factory.blocks[2].data, block_2_expected)
+    assert_list_equal(list(factory.blocks[0].data), block_0_expected)
+    assert_list_equal(list(factory.blocks[1].data), block_1_expected)
+    assert_list_equal(list(factory.blocks[2].data), block_2_expected)
 
 
 def test_rle_byte_on_block_boundary():
@@ -232,9 +233,9 @@ def test_rle_byte_on_block_boundary():
     block_2_expected = [36, filepack.SPECIAL_BYTE, filepack.EOF_BYTE, 0, 0]
 
     assert_equal(len(factory.blocks), 3)
-    assert_list_equal(factory.blocks[0].data, block_0_expected)
-    assert_list_equal(factory.blocks[1].data, block_1_expected)
-    assert_list_equal(factory.blocks[2].data, block_2_expected)
+    assert_list_equal(list(factory.blocks[0].data), block_0_expected)
+    assert_list_equal(list(factory.blocks[1].data), block_1_expected)
+    assert_list_equal(list(factory.blocks[2].data), block_2_expected)
 
 
 def test_full_rle_on_block_boundary():
@@ -249,9 +250,9 @@ def test_full_rle_on_block_boundary():
     block_2_expected = [22, 3, filepack.SPECIAL_BYTE, filepack.EOF_BYTE, 0]
 
     assert_equal(len(factory.blocks), 3)
-    assert_list_equal(factory.blocks[0].data, block_0_expected)
-    assert_list_equal(factory.blocks[1].data, block_1_expected)
-    assert_list_equal(factory.blocks[2].data, block_2_expected)
+    assert_list_equal(list(factory.blocks[0].data), block_0_expected)
+    assert_list_equal(list(factory.blocks[1].data), block_1_expected)
+    assert_list_equal(list(factory.blocks[2].data), block_2_expected)
 
 
 def test_default_on_block_boundary():
@@ -267,9 +268,9 @@ def test_default_on_block_boundary():
     block_2_expected = [2, 5, filepack.SPECIAL_BYTE, filepack.EOF_BYTE, 0]
 
     assert_equal(len(factory.blocks), 3)
-    assert_list_equal(factory.blocks[0].data, block_0_expected)
-    assert_list_equal(factory.blocks[1].data, block_1_expected)
-    assert_list_equal(factory.blocks[2].data, block_2_expected)
+    assert_list_equal(list(factory.blocks[0].data), block_0_expected)
+    assert_list_equal(list(factory.blocks[1].data), block_1_expected)
+    assert_list_equal(list(factory.blocks[2].data), block_2_expected)
 
 
 def test_merge_with_rle_byte():
@@ -474,3 +475,200 @@ def test_sample_song():
 
     assert_equal(len(recompressed), len(compressed))
     assert_list_equal(recompressed, compressed)
+
+
+def test_decompress_bytes_matches_decompress():
+    sample_song_compressed = os.path.join(
+        SCRIPT_DIR, "test_data", "sample_song_compressed.json")
+
+    with open(sample_song_compressed, "r") as fp:
+        compressed = json.load(fp)
+
+    reference = filepack.decompress(compressed)
+
+    for data in (compressed, bytearray(compressed), bytes(bytearray(compressed)),
+                 memoryview(bytearray(compressed))):
+        decompressed = filepack.decompress_bytes(data)
+
+        assert_equal(type(decompressed), bytearray)
+        assert_bytearray_equal(decompressed, reference)
+
+
+def test_decompress_bytes_escapes_and_defaults():
+    data = [filepack.RLE_BYTE, filepack.RLE_BYTE, 1, 2,
+            filepack.SPECIAL_BYTE, filepack.SPECIAL_BYTE,
+            filepack.RLE_BYTE, 0x42, 7,
+            filepack.SPECIAL_BYTE, filepack.DEFAULT_WAVE_BYTE, 3,
+            filepack.SPECIAL_BYTE, filepack.DEFAULT_INSTR_BYTE, 2, 9]
+
+    reference = filepack.decompress(data)
+
+    assert_bytearray_equal(filepack.decompress_bytes(data), reference)
+
+
+@raises(AssertionError)
+def test_decompress_bytes_bogus_special_byte_asserts():
+    data = [filepack.SPECIAL_BYTE, filepack.EOF_BYTE]
+
+    filepack.decompress_bytes(data)
+
+
+def test_compress_bytes_matches_compress():
+    sample_song_raw = os.path.join(
+        SCRIPT_DIR, "test_data", "sample_song_raw_data.json")
+
+    with open(sample_song_raw, "r") as fp:
+        raw_data = json.load(fp)
+
+    reference = filepack.compress(raw_data)
+    compressed = filepack.compress_bytes(raw_data)
+
+    assert_equal(type(compressed), bytearray)
+    assert_bytearray_equal(compressed, reference)
+    assert_bytearray_equal(filepack.decompress_bytes(compressed), raw_data)
+
+
+def test_compress_bytes_token_priorities():
+    data = [filepack.RLE_BYTE] * 5 + [filepack.SPECIAL_BYTE] * 2 + [7] * 300
+    data.extend(filepack.DEFAULT_INSTRUMENT_FILEPACK * 2)
+    data.extend(filepack.DEFAULT_WAVE * 3)
+    data.extend([0xa8, 0xa8, 0xa8])
+    data.extend(filepack.DEFAULT_INSTRUMENT_FILEPACK)
+    data.extend([1, 1, 1, 2])
+
+    assert_bytearray_equal(
+        filepack.compress_bytes(data), filepack.compress(data))
+
+
+def test_optimal_compress_sample_song():
+    sample_song_raw = os.path.join(
+        SCRIPT_DIR, "test_data", "sample_song_raw_data.json")
+
+    with open(sample_song_raw, "r") as fp:
+        raw_data = json.load(fp)
+
+    compressed = filepack.compress(raw_data, mode="optimal")
+
+    assert_list_equal(filepack.decompress(compressed), raw_data)
+    assert_less_equal(len(compressed), len(filepack.compress(raw_data)))
+    assert_equal(len(compressed),
+                 filepack.compressed_size(raw_data, mode="optimal"))
+
+
+def test_optimal_compress_beats_greedy():
+    # Greedy compression escapes both special bytes and swallows the first
+    # byte of the default instrument into the preceding run
+    data = [filepack.SPECIAL_BYTE, filepack.SPECIAL_BYTE, 0xa8, 0xa8, 0xa8,
+            0xa8]
+    data.extend(filepack.DEFAULT_INSTRUMENT_FILEPACK)
+
+    reference = [filepack.RLE_BYTE, filepack.SPECIAL_BYTE, 2,
+                 filepack.RLE_BYTE, 0xa8, 4,
+                 filepack.SPECIAL_BYTE, filepack.DEFAULT_INSTR_BYTE, 1]
+
+    compressed = filepack.compress(data, mode="optimal")
+
+    assert_list_equal(compressed, reference)
+    assert_list_equal(filepack.decompress(compressed), data)
+    assert_equal(filepack.compressed_size(data), 4 + 3 + 15)
+    assert_equal(filepack.compressed_size(data, mode="optimal"), 9)
+
+
+@raises(ValueError)
+def test_unknown_compress_mode():
+    filepack.compress_bytes([1, 2, 3], mode="fastest")
+
+
+def _sample_song_blocks():
+    sample_song_blocks = os.path.join(
+        SCRIPT_DIR, "test_data", "sample_song_blocks.json")
+
+    with open(sample_song_blocks, "r") as fp:
+        song_block_data = json.load(fp)
+
+    return dict(
+        (int(key), bl.Block(int(key), bytearray(data)))
+        for key, data in song_block_data.items())
+
+
+def test_decompress_blocks_matches_merge():
+    blocks = _sample_song_blocks()
+
+    reference = filepack.decompress(filepack.merge(blocks))
+
+    chunks = list(filepack.iter_decompress(blocks))
+    assert_equal(len(chunks), len(blocks))
+    assert_bytearray_equal(bytearray().join(chunks), reference)
+
+    assert_bytearray_equal(filepack.decompress_blocks(blocks), reference)
+
+    raw_data = bytearray(16)
+    filepack.decompress_blocks(blocks, raw_data)
+    assert_bytearray_equal(raw_data, reference)
+
+
+class _CountingBlockMap(dict):
+    def __init__(self, blocks):
+        super(_CountingBlockMap, self).__init__(blocks)
+        self.lookups = []
+
+    def __getitem__(self, key):
+        self.lookups.append(key)
+        return super(_CountingBlockMap, self).__getitem__(key)
+
+
+def test_decompress_blocks_stops_early():
+    blocks = _CountingBlockMap(_sample_song_blocks())
+
+    reference = filepack.decompress(filepack.merge(dict(blocks)))
+
+    first_chunk_size = len(next(filepack.iter_decompress(dict(blocks))))
+
+    partial = filepack.decompress_blocks(blocks, stop=first_chunk_size)
+
+    assert_equal(len(blocks.lookups), 1)
+    assert_bytearray_equal(partial, reference[:first_chunk_size])
+
+
+def test_decompress_range():
+    sample_song_compressed = os.path.join(
+        SCRIPT_DIR, "test_data", "sample_song_compressed.json")
+
+    with open(sample_song_compressed, "r") as fp:
+        compressed = json.load(fp)
+
+    reference = bytearray(filepack.decompress(compressed))
+
+    for start, stop in ((0, 1), (0, 0x100), (0x1234, 0x1240),
+                        (0x7ff0, 0x8000), (0x7ff0, 0x9000)):
+        assert_bytearray_equal(
+            filepack.decompress_range(compressed, start, stop),
+            reference[start:stop])
+
+
+def test_renumber_block_switches():
+    blocks = _sample_song_blocks()
+    chain = filepack.block_chain(blocks)
+
+    assert_equal(len(chain), len(blocks))
+    assert_equal(chain[0].id, min(blocks.keys()))
+
+    new_ids = [100 + 2 * i for i in range(len(chain))]
+
+    renumbered = dict(
+        (block_id, bl.Block(block_id, data)) for block_id, data in zip(
+            new_ids,
+            filepack.renumber_block_switches(
+                [block.data for block in chain], new_ids)))
+
+    assert_bytearray_equal(filepack.decompress_blocks(renumbered),
+                           filepack.decompress_blocks(blocks))
+
+
+@raises(AssertionError)
+def test_truncated_rle_during_split_asserts():
+    data = [42, filepack.RLE_BYTE, 17]
+
+    factory = bl.BlockFactory()
+
+    filepack.split(data, bl.BLOCK_SIZE, factory)
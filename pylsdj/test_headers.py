@@ -0,0 +1,82 @@
+import os
+import sys
+from nose.tools import assert_equal, raises
+
+SCRIPT_DIR = os.path.abspath(os.path.dirname(__file__))
+
+sys.path.append(os.path.join(SCRIPT_DIR, os.path.pardir))
+
+import bread
+
+from . import bread_spec
+from . import headers
+from .exceptions import ImportException
+
+SAV_IN = os.path.join(SCRIPT_DIR, "test_data", "lsdj.sav")
+LSDSNG_IN = os.path.join(SCRIPT_DIR, "test_data", "UNTOLDST.lsdsng")
+
+
+def _sav_header_data():
+    with open(SAV_IN, 'rb') as fp:
+        fp.seek(0x8000)
+        return fp.read(headers.SAV_HEADER_SIZE)
+
+
+def test_sav_header_matches_bread():
+    data = _sav_header_data()
+
+    header = headers.read_sav_header(data, validate=True)
+    bread_header = bread.parse(data, bread_spec.compressed_sav_file)
+
+    assert_equal(header.as_native(), bread_header.as_native())
+    assert_equal(headers.write_sav_header(header), data)
+    assert_equal(headers.read_sav_header(
+        headers.write_sav_header(bread_header)).as_native(),
+        bread_header.as_native())
+
+
+def test_sav_header_short_names():
+    header = headers.read_sav_header(_sav_header_data())
+    header.filenames[0] = 'SHORT'
+
+    data = headers.write_sav_header(header)
+
+    assert_equal(headers.read_sav_header(data).filenames[0],
+                 b'SHORT\0\0\0')
+
+
+@raises(ValueError)
+def test_sav_header_bad_value():
+    header = headers.read_sav_header(_sav_header_data())
+    header.file_versions[3] = 256
+
+    headers.write_sav_header(header)
+
+
+@raises(ValueError)
+def test_sav_header_long_name():
+    header = headers.read_sav_header(_sav_header_data())
+    header.filenames[0] = 'ABCDEFGHIJK'
+
+    headers.write_sav_header(header)
+
+
+@raises(ImportException)
+def test_sav_header_short_data():
+    headers.read_sav_header(_sav_header_data()[:100])
+
+
+def test_lsdsng_preamble():
+    with open(LSDSNG_IN, 'rb') as fp:
+        data = fp.read(headers.LSDSNG_PREAMBLE_SIZE)
+
+    preamble = headers.read_lsdsng_preamble(data, validate=True)
+
+    assert_equal(preamble.name, b'UNTOLDST')
+    assert_equal(
+        headers.write_lsdsng_preamble(preamble.name, preamble.version), data)
+
+
+@raises(ValueError)
+def test_lsdsng_preamble_long_name():
+    headers.write_lsdsng_preamble('ABCDEFGHIJK', 3)
@@ -1,7 +1,7 @@
 import os
 import tempfile
 
-from nose.tools import assert_equal, raises
+from nose.tools import assert_equal, assert_true, raises
 
 from .kits import Kits
 from .utils import name_without_zeroes
@@ -73,6 +73,46 @@ def test_load_save_sample():
     assert_equal(sample.sample_data, read_sample.sample_data)
 
 
+def test_sample_data_matches_bread():
+    test_rom = os.path.join(os.path.dirname(__file__), "test_data",
+                            "lsdj_onlykits.gb")
+
+    kits = Kits(test_rom)
+
+    for kit in kits:
+        for sample in kit:
+            sample_start, sample_end = sample._get_sample_data_bounds()
+
+            assert_equal(list(sample.sample_data),
+                         kit._data.sample_data[sample_start:sample_end])
+
+    assert_equal(len(kits[15].samples[3].sample_data), 0x2140 - 0x1a00)
+
+
+def test_replace_sample_moves_later_samples():
+    test_rom = os.path.join(os.path.dirname(__file__), "test_data",
+                            "lsdj_onlykits.gb")
+
+    kits = Kits(test_rom)
+    kit = kits[1]
+
+    later_samples = [sample.sample_data for sample in kit.samples[3:]]
+    new_sample = bytearray([i % 16 for i in range(100)])
+
+    kit.samples[2].sample_data = new_sample
+
+    assert_equal(kit.samples[2].sample_data, new_sample)
+    assert_equal([sample.sample_data for sample in kit.samples[3:]],
+                 later_samples)
+
+    # Sample data can also be given as bytes
+    kit.samples[2].sample_data = bytes(new_sample[:50])
+
+    assert_equal(kit.samples[2].sample_data, new_sample[:50])
+    assert_equal([sample.sample_data for sample in kit.samples[3:]],
+                 later_samples)
+
+
 @raises(Exception)
 def test_load_save_too_large_sample():
     test_rom = os.path.join(os.path.dirname(__file__), "test_data",
@@ -101,3 +141,37 @@ def test_load_save_too_large_sample():
 #                 name_without_zeroes(kit.name), sample.index, name_without_zeroes(sample.name)))
 
 #     raise Exception('foo')
+
+
+def test_kits_loaded_lazily():
+    test_rom = os.path.join(os.path.dirname(__file__), "test_data",
+                            "lsdj_onlykits.gb")
+
+    kits = Kits(test_rom)
+    headers = kits.headers()
+
+    assert_equal(kits._kits, [None] * len(kits))
+
+    for header, kit in zip(headers, kits):
+        assert_equal(header.name, kit.name)
+        assert_equal(header.sample_names,
+                     [sample.name for sample in kit.samples])
+        assert_equal(header.sample_bounds,
+                     [sample._get_sample_data_bounds() if sample.used
+                      else None for sample in kit.samples])
+
+    assert_equal(headers[1].sample_bounds[0], (0, 736))
+    assert_equal(headers[4].sample_bounds[11], None)
+
+
+def test_kit_changes_kept():
+    test_rom = os.path.join(os.path.dirname(__file__), "test_data",
+                            "lsdj_onlykits.gb")
+
+    kits = Kits(test_rom)
+    kits[3].samples[0].sample_data = bytearray(100)
+
+    assert_true(kits[3] is kits[3])
+    assert_equal(kits[3].samples[0].sample_data, bytearray(100))
+    assert_equal(kits.headers()[3].sample_bounds[0], (0, 100))
+    assert_equal(kits[-1].name, b'GHETTO')
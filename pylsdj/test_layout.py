@@ -0,0 +1,96 @@
+import os
+import sys
+from nose.tools import assert_equal, raises
+
+SCRIPT_DIR = os.path.abspath(os.path.dirname(__file__))
+
+sys.path.append(os.path.join(SCRIPT_DIR, os.path.pardir))
+
+from . import layout
+from .project import load_lsdsng
+
+
+def _load_sample_project():
+    return load_lsdsng(os.path.join(SCRIPT_DIR, "test_data", "UNTOLDST.lsdsng"))
+
+
+def test_song_layout_matches_parsed_song():
+    proj = _load_sample_project()
+    raw_data = proj._raw_bytes
+    song_data = proj.song.song_data
+
+    tempo = layout.SONG_LAYOUT['tempo']
+    assert_equal(raw_data[layout.byte_offset(tempo)], song_data.tempo)
+
+    phrase_instruments = layout.SONG_LAYOUT['phrase_instruments']
+    assert_equal(phrase_instruments.shape, (255, 16))
+    assert_equal(phrase_instruments.strides, (16 * 8, 8))
+
+    for phrase in (0, 1, 17, 254):
+        for step in (0, 5, 15):
+            assert_equal(
+                raw_data[layout.byte_offset(phrase_instruments, phrase, step)],
+                song_data.phrase_instruments[phrase][step])
+
+    pu2 = layout.SONG_LAYOUT['song.pu2']
+    for row in (0, 3, 255):
+        assert_equal(raw_data[layout.byte_offset(pu2, row)],
+                     song_data.song[row].pu2)
+
+    volume = layout.SONG_LAYOUT['softsynth_params.end.volume']
+    for synth in range(16):
+        assert_equal(raw_data[layout.byte_offset(volume, synth)],
+                     song_data.softsynth_params[synth].end.volume)
+
+
+def test_conditional_fields():
+    envelope = layout.SONG_LAYOUT['instruments.pulse.envelope']
+    instrument_type = layout.SONG_LAYOUT['instruments.instrument_type']
+
+    assert_equal(envelope.shape, (64,))
+    assert_equal(envelope.offset, instrument_type.offset + 8)
+    assert_equal(layout.INSTRUMENT_LAYOUT['pulse.envelope'].offset, 8)
+
+    proj = _load_sample_project()
+    raw_data = proj._raw_bytes
+
+    for index, instrument in enumerate(proj.song.song_data.instruments):
+        if instrument.instrument_type == "pulse":
+            assert_equal(raw_data[layout.byte_offset(envelope, index)],
+                         instrument.envelope)
+
+
+def test_top_level_sizes_cover_song():
+    song_fields = list(layout.SONG_FIELDS.values())
+
+    for field, next_field in zip(song_fields, song_fields[1:]):
+        assert_equal(field.size, field.item_size * max(1, _count(field)))
+        assert field.offset + field.size <= next_field.offset
+
+    last_field = song_fields[-1]
+    assert last_field.offset + last_field.size <= 0x8000 * 8
+
+
+def _count(field):
+    count = 1
+    for dimension in field.shape:
+        count *= dimension
+    return count
+
+
+def test_sav_header_layout():
+    file_versions = layout.SAV_HEADER_LAYOUT['file_versions']
+    block_alloc_table = layout.SAV_HEADER_LAYOUT['block_alloc_table']
+
+    assert_equal(layout.byte_offset(file_versions, 3), 256 + 3)
+    assert_equal(layout.byte_range(block_alloc_table), (321, 512))
+
+
+@raises(IndexError)
+def test_out_of_range_index():
+    layout.bit_offset(layout.SONG_LAYOUT['phrase_notes'], 255, 0)
+
+
+@raises(ValueError)
+def test_unaligned_element():
+    layout.byte_offset(layout.SONG_LAYOUT['wave_frames'], 0, 0, 1)
@@ -0,0 +1,55 @@
+import os
+
+from nose.tools import assert_equal, raises
+
+from . import nibbles
+
+
+def test_unpack_nibbles():
+    assert_equal(nibbles.unpack_nibbles(b'\x12\xab\xf0'),
+                 bytearray([1, 2, 0xa, 0xb, 0xf, 0]))
+
+
+def test_pack_nibbles():
+    assert_equal(nibbles.pack_nibbles([1, 2, 0xa, 0xb, 0xf, 0]),
+                 b'\x12\xab\xf0')
+
+
+def test_pack_bytes():
+    assert_equal(nibbles.pack_nibbles(b'\x01\x02\x0a\x0b'), b'\x12\xab')
+    assert_equal(nibbles.pack_nibbles(bytearray(b'\x01\x02')), b'\x12')
+    assert_equal(nibbles.pack_nibbles(memoryview(b'\x01\x02')), b'\x12')
+
+
+def test_round_trip():
+    data = os.urandom(0x100)
+
+    assert_equal(nibbles.pack_nibbles(nibbles.unpack_nibbles(data)), data)
+
+
+def test_pack_without_numpy():
+    real_numpy = nibbles._numpy
+    nibbles._numpy = lambda: None
+
+    try:
+        assert_equal(nibbles.pack_nibbles(bytearray([0xf, 1, 2, 3])),
+                     b'\xf1\x23')
+        assert_equal(nibbles.pack_nibbles(b'\x0f\x01'), b'\xf1')
+    finally:
+        nibbles._numpy = real_numpy
+
+
+@raises(ValueError)
+def test_pack_odd_number_of_nibbles():
+    nibbles.pack_nibbles([1, 2, 3])
+
+
+@raises(ValueError)
+def test_pack_nibble_out_of_range():
+    nibbles.pack_nibbles([1, 0x10])
+
+
+def test_samples():
+    assert_equal(nibbles.nibbles_to_samples([0, 8, 0xf]), b'\x00\x80\xf0')
+    assert_equal(nibbles.samples_to_nibbles(b'\x00\x8f\xf0'),
+                 bytearray([0, 8, 0xf]))
@@ -2,13 +2,17 @@ import json
 import os
 import sys
 import math
-from nose.tools import assert_equal, assert_less
+from nose.tools import assert_equal, assert_less, assert_true, assert_false, \
+    raises
+
+import bread
 
 SCRIPT_DIR = os.path.abspath(os.path.dirname(__file__))
 
 sys.path.append(os.path.join(SCRIPT_DIR, os.path.pardir))
 
 from . import filepack as filepack
+from . import bread_spec as spec
 from .project import Project, load_lsdsng, load_srm
 from .utils import temporary_file
 
@@ -101,5 +105,120 @@ def test_save_load_srm():
         read_proj = load_srm(tmp_proj_abspath)
         assert_equal(proj, read_proj)
 
+def test_read_field():
+    sample_song_compressed = os.path.join(
+        SCRIPT_DIR, "test_data", "UNTOLDST.lsdsng")
+
+    for name in ("tempo", "instrument_names", "phrase_alloc_table",
+                 "softsynth_params", "version"):
+        proj = load_lsdsng(sample_song_compressed)
+        value = proj.read_field(name)
+
+        expected = getattr(load_lsdsng(sample_song_compressed)._song_data,
+                           name)
+
+        if hasattr(expected, 'as_native'):
+            value = value.as_native()
+            expected = expected.as_native()
+
+        assert_equal(value, expected)
+
+
+def test_read_field_after_modification():
+    sample_song_compressed = os.path.join(
+        SCRIPT_DIR, "test_data", "UNTOLDST.lsdsng")
+
+    proj = load_lsdsng(sample_song_compressed)
+    proj.song.song_data.tempo = 42
+
+    assert_equal(42, proj.read_field("tempo"))
+
+
+def test_dirty():
+    sample_song_compressed = os.path.join(
+        SCRIPT_DIR, "test_data", "UNTOLDST.lsdsng")
+
+    proj = load_lsdsng(sample_song_compressed)
+    assert_false(proj.dirty)
+
+    original_tempo = proj.song.tempo
+    assert_false(proj.dirty)
+
+    proj.song.tempo = original_tempo + 1
+    assert_true(proj.dirty)
+    assert_equal(bread.parse(proj.get_raw_data(), spec.song).tempo,
+                 original_tempo + 1)
+
+    proj.song.tempo = original_tempo
+    assert_false(proj.dirty)
+
+
+def test_dirty_for_any_data_type():
+    sample_song_compressed = os.path.join(
+        SCRIPT_DIR, "test_data", "UNTOLDST.lsdsng")
+
+    raw_data = load_lsdsng(sample_song_compressed).get_raw_data()
+
+    for data in (list(raw_data), bytes(raw_data), bytearray(raw_data)):
+        proj = Project('UNTOLDST', 1, 1, data)
+        assert_false(proj.dirty)
+
+        proj.song.tempo += 1
+        assert_true(proj.dirty)
+
+
+def test_save_untouched_lsdsng():
+    sample_song_compressed = os.path.join(
+        SCRIPT_DIR, "test_data", "UNTOLDST.lsdsng")
+
+    with open(sample_song_compressed, 'rb') as fp:
+        original_bytes = fp.read()
+
+    proj = load_lsdsng(sample_song_compressed)
+    assert_equal(proj.song.tempo, proj.read_field("tempo"))
+
+    with temporary_file() as tmp_abspath:
+        proj.save_lsdsng(tmp_abspath)
+
+        with open(tmp_abspath, 'rb') as fp:
+            assert_equal(fp.read(), original_bytes)
+
+        proj.song.tempo += 1
+        proj.save_lsdsng(tmp_abspath)
+
+        assert_equal(load_lsdsng(tmp_abspath).song.tempo, proj.song.tempo)
+
+
+def test_song_objects_created_on_access():
+    sample_song_compressed = os.path.join(
+        SCRIPT_DIR, "test_data", "UNTOLDST.lsdsng")
+
+    song = load_lsdsng(sample_song_compressed).song
+
+    assert_equal(song.phrases.access_objects,
+                 [None] * len(song.phrases.access_objects))
+    assert_equal(song.synths.access_objects,
+                 [None] * len(song.synths.access_objects))
+
+    phrase = song.phrases[0]
+    assert song.phrases[0] is phrase
+    assert_equal(phrase.index, 0)
+
+    synths = song.synths.as_list()
+    assert_equal([synth.index for synth in synths], list(range(len(synths))))
+
+    instruments = song.instruments.as_list()
+    assert_equal([instrument.type for instrument in instruments],
+                 [instrument.instrument_type for instrument
+                  in song.song_data.instruments])
+
+
+@raises(ValueError)
+def test_read_unknown_field():
+    sample_song_compressed = os.path.join(
+        SCRIPT_DIR, "test_data", "UNTOLDST.lsdsng")
+
+    load_lsdsng(sample_song_compressed).read_field("not_a_field")
+
 if __name__ == "__main__":
     test_srm_load()
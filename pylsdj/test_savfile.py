@@ -1,6 +1,7 @@
 import os
 import sys
-from nose.tools import assert_equal, with_setup
+from nose.tools import assert_equal, assert_false, assert_raises, raises, \
+    with_setup
 
 from .project import load_lsdsng
 from .utils import temporary_file
@@ -33,3 +34,367 @@ def test_set_project():
     sav = savfile.SAVFile(SAV_IN)
 
     sav.projects[5] = proj
+
+def test_save_after_changing_one_project():
+    sav = savfile.SAVFile(SAV_IN)
+    sav.projects[3].song.tempo += 1
+
+    # Replace a project with one from an .lsdsng, whose blocks are numbered
+    # differently
+    sav.projects[1] = load_lsdsng(os.path.join(
+        SCRIPT_DIR, "test_data", "ANNARKTE.lsdsng"))
+
+    with temporary_file() as SAV_OUT:
+        sav.save(SAV_OUT)
+
+        new_sav = savfile.SAVFile(SAV_OUT)
+
+        original_sav = savfile.SAVFile(SAV_IN)
+
+        for i in range(savfile.NUM_FILES):
+            assert_equal(sav.projects[i], new_sav.projects[i])
+
+        assert_equal(new_sav.projects[3].song.tempo,
+                     original_sav.projects[3].song.tempo + 1)
+        assert_equal(new_sav.projects[0], original_sav.projects[0])
+
+
+def test_mmap_load():
+    sav = savfile.SAVFile(SAV_IN)
+    mapped_sav = savfile.SAVFile(SAV_IN, mmap=True)
+
+    assert_equal(sav, mapped_sav)
+    assert_equal(mapped_sav.projects[0].song.tempo,
+                 sav.projects[0].song.tempo)
+
+    mapped_sav.projects[2].song.tempo += 1
+
+    with temporary_file() as SAV_OUT:
+        mapped_sav.save(SAV_OUT)
+
+        new_sav = savfile.SAVFile(SAV_OUT)
+
+        assert_equal(mapped_sav, new_sav)
+
+
+def test_mmap_save_in_place():
+    with temporary_file() as SAV_OUT:
+        with open(SAV_IN, 'rb') as in_fp:
+            with open(SAV_OUT, 'wb') as out_fp:
+                out_fp.write(in_fp.read())
+
+        sav = savfile.SAVFile(SAV_OUT, mmap=True)
+        sav.projects[1].song.tempo += 1
+        sav.save(SAV_OUT)
+
+        assert_equal(sav, savfile.SAVFile(SAV_OUT))
+
+
+def test_mmap_blocks_read_lazily():
+    sav = savfile.SAVFile(SAV_IN, mmap=True)
+    project = sav.projects[0]
+
+    read_blocks = []
+    read = project._blocks._read
+
+    def counting_read(block_id):
+        read_blocks.append(block_id)
+        return read(block_id)
+
+    project._blocks._read = counting_read
+
+    # Reading the start of the song only needs the first block
+    project._raw_range(0, 16)
+    assert_equal(len(read_blocks), 1)
+    assert project.size_blks > 1
+
+
+def test_mmap_close():
+    with savfile.SAVFile(SAV_IN, mmap=True) as sav:
+        file_map = sav._file_map
+        sav.projects[2].song.tempo += 1
+        project_0 = sav.projects[0]
+
+        # Saving needs every project, so load them before closing
+        sav.load_all()
+
+    # mmaps have no closed attribute on Python 2, but reading a closed one
+    # fails on both
+    assert_raises(ValueError, file_map.read, 1)
+
+    # Projects loaded before the file was closed still work
+    assert_equal(project_0, savfile.SAVFile(SAV_IN).projects[0])
+
+    with temporary_file() as SAV_OUT:
+        sav.save(SAV_OUT)
+
+        new_sav = savfile.SAVFile(SAV_OUT)
+
+        assert_equal(new_sav.projects[2].song.tempo,
+                     sav.projects[2].song.tempo)
+        assert_equal(new_sav.projects[0], project_0)
+
+    # Closing twice is harmless
+    sav.close()
+
+
+def test_close_after_replacing_project():
+    sav = savfile.SAVFile(SAV_IN, mmap=True)
+    file_map = sav._file_map
+
+    project = sav.projects[0]
+    sav.projects[0] = sav.projects[1]
+    sav.close()
+
+    # mmaps have no closed attribute on Python 2, but reading a closed one
+    # fails on both
+    assert_raises(ValueError, file_map.read, 1)
+    assert_equal(project, savfile.SAVFile(SAV_IN).projects[0])
+
+
+def test_mmap_closed_when_load_fails():
+    with open(SAV_IN, 'rb') as fp:
+        data = bytearray(fp.read())
+
+    data[savfile.SAVFile.SRAM_INIT_CHECK_OFFSET] = ord('x')
+
+    file_maps = []
+    map_file = savfile._map_file
+
+    def _record_map_file(fp):
+        file_maps.append(map_file(fp))
+        return file_maps[-1]
+
+    savfile._map_file = _record_map_file
+
+    try:
+        with temporary_file() as sav_out:
+            with open(sav_out, 'wb') as fp:
+                fp.write(data)
+
+            assert_raises(ValueError, savfile.SAVFile, sav_out, mmap=True)
+    finally:
+        savfile._map_file = map_file
+
+    assert_equal(len(file_maps), 1)
+    assert_raises(ValueError, file_maps[0].read, 1)
+
+
+@raises(ValueError)
+def test_load_project_after_close():
+    sav = savfile.SAVFile(SAV_IN, mmap=True)
+    sav.close()
+
+    sav.projects[0]
+
+
+def test_block_index():
+    sav = savfile.SAVFile(SAV_IN)
+    index = sav.block_index
+
+    alloc_table = list(sav.header_block.block_alloc_table)
+
+    assert_equal(index.num_free_blocks, alloc_table.count(savfile.EMPTY_BLOCK))
+    assert_equal(index.free_blocks,
+                 [i + 1 for i, file_number in enumerate(alloc_table)
+                  if file_number == savfile.EMPTY_BLOCK])
+
+    for file_number in range(savfile.NUM_FILES):
+        blocks = index.blocks(file_number)
+
+        assert_equal(blocks, [i + 1 for i, f in enumerate(alloc_table)
+                              if f == file_number])
+        assert_equal(index.size_blks(file_number), len(blocks))
+
+        project = sav.projects[file_number]
+
+        if project is None:
+            assert_equal(blocks, [])
+        else:
+            assert_equal(project.size_blks, len(blocks))
+            assert file_number in index.file_numbers()
+
+
+def test_load_all():
+    sav = savfile.SAVFile(SAV_IN)
+
+    for preload in ("serial", "parallel"):
+        preloaded_sav = savfile.SAVFile(SAV_IN, preload=preload, workers=2)
+
+        for i in range(savfile.NUM_FILES):
+            project = preloaded_sav.projects._projects[i]
+
+            if project is None:
+                assert_equal(sav.projects[i], None)
+            else:
+                assert_false(project.dirty)
+                assert_equal(project.size_blks, sav.projects[i].size_blks)
+                assert_equal(project, sav.projects[i])
+
+
+def test_load_all_with_executor():
+    from concurrent.futures import ThreadPoolExecutor
+
+    sav = savfile.SAVFile(SAV_IN, mmap=True)
+    first_project = sav.projects[0]
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        sav.load_all(executor=executor)
+
+    # Projects that were already loaded are kept
+    assert sav.projects[0] is first_project
+    assert_equal(sav, savfile.SAVFile(SAV_IN))
+
+
+@raises(ValueError)
+def test_unknown_preload_mode():
+    savfile.SAVFile(SAV_IN, preload="eventually")
+
+
+def test_parallel_save():
+    def modified_sav():
+        sav = savfile.SAVFile(SAV_IN)
+
+        for i in (0, 4, 9):
+            sav.projects[i].song.tempo += 1
+
+        return sav
+
+    with temporary_file() as serial_out:
+        with temporary_file() as parallel_out:
+            modified_sav().save(serial_out)
+            modified_sav().save(parallel_out, workers=2)
+
+            with open(serial_out, 'rb') as serial_fp:
+                with open(parallel_out, 'rb') as parallel_fp:
+                    assert_equal(serial_fp.read(), parallel_fp.read())
+
+
+def test_scan_header():
+    sav = savfile.SAVFile(SAV_IN)
+    header = savfile.scan_header(SAV_IN)
+
+    assert_equal(list(header.filenames), list(sav.header_block.filenames))
+    assert_equal(list(header.file_versions),
+                 list(sav.header_block.file_versions))
+    assert_equal(header.active_file, sav.active_project_number)
+    assert_equal(header.block_counts,
+                 tuple(sav.block_index.size_blks(i)
+                       for i in range(savfile.NUM_FILES)))
+
+
+def test_scan_header_corrupt_alloc_table():
+    with open(SAV_IN, 'rb') as fp:
+        data = bytearray(fp.read())
+
+    # Give a free block and a project's block to a file that can't exist
+    alloc_table = list(data[savfile.SAVFile.BAT_START_OFFSET:
+                            savfile.SAVFile.BAT_END_OFFSET + 1])
+    free_block = alloc_table.index(savfile.EMPTY_BLOCK)
+    used_block = alloc_table.index(0)
+
+    for block in (free_block, used_block):
+        data[savfile.SAVFile.BAT_START_OFFSET + block] = savfile.NUM_FILES
+
+    with temporary_file() as sav_out:
+        with open(sav_out, 'wb') as fp:
+            fp.write(data)
+
+        header = savfile.scan_header(sav_out)
+        index = savfile.SAVFile(sav_out).block_index
+
+        assert_equal(header.block_counts,
+                     tuple(index.size_blks(i)
+                           for i in range(savfile.NUM_FILES)))
+        assert_equal(index.file_numbers(),
+                     [file_number for file_number, count
+                      in enumerate(header.block_counts) if count > 0])
+
+
+@raises(ValueError)
+def test_scan_header_bad_init_check():
+    with open(SAV_IN, 'rb') as fp:
+        data = bytearray(fp.read())
+
+    data[savfile.SAVFile.SRAM_INIT_CHECK_OFFSET] = ord('x')
+
+    with temporary_file() as sav_out:
+        with open(sav_out, 'wb') as fp:
+            fp.write(data)
+
+        savfile.scan_header(sav_out)
+
+
+def test_atomic_save():
+    sav = savfile.SAVFile(SAV_IN)
+
+    with temporary_file() as plain_out:
+        with temporary_file() as atomic_out:
+            sav.save(plain_out)
+            sav.save(atomic_out, atomic=True)
+
+            with open(plain_out, 'rb') as plain_fp:
+                with open(atomic_out, 'rb') as atomic_fp:
+                    assert_equal(plain_fp.read(), atomic_fp.read())
+
+
+def test_failed_atomic_save_keeps_file():
+    def failing_callback(message, step, total_steps, continuing):
+        if message == "Writing data to file":
+            raise IOError("Disk full")
+
+    with temporary_file() as sav_out:
+        with open(sav_out, 'wb') as fp:
+            fp.write(b'original')
+
+        try:
+            savfile.SAVFile(SAV_IN).save(sav_out, failing_callback,
+                                         atomic=True)
+        except IOError:
+            pass
+
+        with open(sav_out, 'rb') as fp:
+            assert_equal(fp.read(), b'original')
+
+
+def test_atomic_save_keeps_mode():
+    with temporary_file() as sav_out:
+        with open(sav_out, 'wb') as fp:
+            fp.write(b'original')
+
+        os.chmod(sav_out, 0o644)
+
+        savfile.SAVFile(SAV_IN).save(sav_out, atomic=True)
+        assert_equal(os.stat(sav_out).st_mode & 0o777, 0o644)
+
+        # Saving a mapped file over itself saves atomically too
+        sav = savfile.SAVFile(sav_out, mmap=True)
+        sav.save(sav_out)
+        assert_equal(os.stat(sav_out).st_mode & 0o777, 0o644)
+
+
+def test_save_over_itself():
+    with temporary_file() as sav_out:
+        savfile.SAVFile(SAV_IN).save(sav_out)
+
+        with open(sav_out, 'rb') as fp:
+            saved = fp.read()
+
+        savfile.SAVFile(sav_out).save(sav_out)
+
+        with open(sav_out, 'rb') as fp:
+            assert_equal(fp.read(), saved)
+
+
+def test_atomic_save_new_file_uses_umask():
+    with temporary_file() as sav_out:
+        os.remove(sav_out)
+
+        umask = os.umask(0o022)
+
+        try:
+            savfile.SAVFile(SAV_IN).save(sav_out, atomic=True)
+        finally:
+            os.umask(umask)
+
+        assert_equal(os.stat(sav_out).st_mode & 0o777, 0o644)
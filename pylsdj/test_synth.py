@@ -1,8 +1,9 @@
 import os
-from nose.tools import assert_false, assert_true
+from nose.tools import assert_equal, assert_false, assert_true
 
 SCRIPT_DIR = os.path.abspath(os.path.dirname(__file__))
 
+from .bread_spec import FRAMES_PER_WAVE, NUM_SYNTHS
 from .project import load_lsdsng
 
 def test_wave_synth_overwrite_locks():
@@ -20,3 +21,30 @@ def test_wave_synth_overwrite_locks():
                 "Expected wave synth overwrite lock to be enabled "
                 "after modifying wave frames")
     assert_true(project.song.synths[4].wave_synth_overwrite_lock)
+
+
+def test_waves_match_song_data():
+    test_project = os.path.join(SCRIPT_DIR, 'test_data', 'UNTOLDST.lsdsng')
+
+    project = load_lsdsng(test_project)
+    wave_frames = project.song.song_data.wave_frames.as_native()
+
+    for synth_index in range(NUM_SYNTHS):
+        synth = project.song.synths[synth_index]
+
+        for i, wave in enumerate(synth.export()['waves']):
+            assert_equal(wave, wave_frames[synth_index][i])
+
+
+def test_set_whole_wave():
+    test_project = os.path.join(SCRIPT_DIR, 'test_data', 'UNTOLDST.lsdsng')
+
+    project = load_lsdsng(test_project)
+    frames = [i % 16 for i in range(FRAMES_PER_WAVE)]
+
+    project.song.synths[2].waves[7] = frames
+
+    assert_equal(list(project.song.synths[2].waves[7]), frames)
+    assert_equal(project.song.synths[2].waves[7][3:5], [3, 4])
+    assert_equal(project.song.song_data.wave_frames[2][7].as_native(), frames)
+    assert_true(project.song.synths[2].wave_synth_overwrite_lock)
@@ -0,0 +1,137 @@
+import os
+import sys
+from nose.tools import assert_equal, assert_true, raises
+
+import bread
+
+SCRIPT_DIR = os.path.abspath(os.path.dirname(__file__))
+
+sys.path.append(os.path.join(SCRIPT_DIR, os.path.pardir))
+
+from . import bread_spec, layout
+from .project import load_lsdsng
+from .views import SongData, song_field
+
+
+def _sample_raw_data(name="UNTOLDST"):
+    proj = load_lsdsng(
+        os.path.join(SCRIPT_DIR, "test_data", "%s.lsdsng" % (name)))
+
+    return bytes(proj._raw_bytes)
+
+
+def _byte_offset(name):
+    return layout.byte_offset(layout.SONG_FIELDS[name])
+
+
+def test_matches_bread():
+    raw_data = _sample_raw_data()
+
+    song_data = SongData(raw_data)
+    parsed = bread.parse(raw_data, bread_spec.song)
+
+    assert_equal(song_data.tempo, parsed.tempo)
+    assert_equal(song_data.instrument_names[3], parsed.instrument_names[3])
+    assert_equal(list(song_data.phrase_notes[17]), parsed.phrase_notes[17][:])
+    assert_equal(song_data.wave_frames[2][3][:], parsed.wave_frames[2][3][:])
+    assert_equal(song_data.instruments.as_native(),
+                 parsed.instruments.as_native())
+    assert_equal(song_data.softsynth_params.as_native(),
+                 parsed.softsynth_params.as_native())
+
+
+def test_whole_song_matches_bread():
+    for name in ("UNTOLDST", "ANNARKTE", "ARDBOYxx"):
+        raw_data = _sample_raw_data(name)
+
+        assert_equal(SongData(raw_data).as_native(),
+                     bread.parse(raw_data, bread_spec.song).as_native())
+
+
+def test_writes_match_bread():
+    raw_data = _sample_raw_data()
+    other_raw_data = _sample_raw_data("ANNARKTE")
+
+    song_data = SongData(raw_data)
+    parsed = bread.parse(raw_data, bread_spec.song)
+    other = SongData(other_raw_data)
+
+    for target in (song_data, parsed):
+        target.tempo = 42
+        target.phrase_notes[3][4] = 'C 4'
+        target.phrase_alloc_table[200] = True
+        target.instrument_names[0] = b'HELLO'
+        target.wave_frames[15][2][7] = 0xa
+        target.clock.hours = 7
+
+        for index in range(len(other.instruments)):
+            source = other.instruments[index]
+            instrument = target.instruments[index]
+
+            instrument.instrument_type = source.instrument_type
+
+            if source.instrument_type in ('pulse', 'wave'):
+                instrument.table_on = source.table_on
+                instrument.table = source.table
+                instrument.vibrato.direction = source.vibrato.direction
+
+    assert_equal(song_data.raw_data, bread.write(parsed))
+
+
+def test_refers_to_raw_data():
+    raw_data = bytearray(_sample_raw_data())
+
+    song_data = SongData(raw_data)
+    song_data.tempo = 0xab
+
+    assert_true(song_data.raw_data is raw_data)
+    assert_equal(raw_data[_byte_offset('tempo')], 0xab)
+
+
+def test_song_field():
+    raw_data = _sample_raw_data()
+    start = _byte_offset('instrument_names')
+
+    assert_equal(song_field(bytearray(raw_data[start:start + 5]), start,
+                            'instrument_names')[0],
+                 SongData(raw_data).instrument_names[0])
+
+
+def test_conditional_fields():
+    song_data = SongData(_sample_raw_data())
+
+    instrument = song_data.instruments[0]
+    instrument.instrument_type = 'noise'
+
+    assert_true(hasattr(instrument, 'envelope'))
+    assert_true(not hasattr(instrument, 'wave'))
+
+
+@raises(ValueError)
+def test_set_struct():
+    SongData(_sample_raw_data()).clock = 5
+
+
+@raises(IndexError)
+def test_index_out_of_range():
+    SongData(_sample_raw_data()).phrase_notes[255]
+
+
+def test_field_views_are_reused():
+    raw_data = bytearray(_sample_raw_data())
+    song_data = SongData(raw_data)
+
+    phrase_notes = song_data.phrase_notes
+    assert song_data.phrase_notes is phrase_notes
+
+    # Reused views still read through to the raw data
+    offset = layout.byte_offset(
+        layout.SONG_LAYOUT['phrase_instruments'], 2, 3)
+    raw_data[offset] = 0x12
+
+    assert_equal(song_data.phrase_instruments[2][3], 0x12)
+
+    # Leaf fields aren't cached
+    tempo = song_data.tempo
+    raw_data[_byte_offset('tempo')] = (tempo + 1) % 256
+    assert_equal(song_data.tempo, (tempo + 1) % 256)
@@ -1,4 +1,7 @@
+import binascii
+import errno
 import os
+import shutil
 import tempfile
 from .vendor.six.moves import range
 
@@ -54,5 +57,77 @@ class temporary_file:
         if hasattr(self, 'abspath') and self.abspath is not None:
             os.unlink(self.abspath)
 
+def _create_temporary_file(filename):
+    # Like tempfile.mkstemp, but the file gets the permissions that open()
+    # would give it; the kernel applies the umask, which can't be read
+    # without setting it for the whole process
+    dirname, basename = os.path.split(os.path.abspath(filename))
+    flags = os.O_CREAT | os.O_EXCL | os.O_WRONLY | getattr(os, 'O_BINARY', 0)
+
+    while True:
+        tmp_filename = os.path.join(dirname, '.%s.%s.tmp' % (
+            basename, binascii.hexlify(os.urandom(6)).decode('ascii')))
+
+        try:
+            return (os.open(tmp_filename, flags, 0o666), tmp_filename)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+class atomic_file(object):
+    """Open a file for writing such that it only replaces ``filename`` once
+    it has been written completely. The file is written under a temporary
+    name in the same directory and renamed into place when the block exits
+    without an error; otherwise, it's removed.
+
+    If ``filename`` already exists, the new file gets its permissions;
+    otherwise it gets the permissions that ``open()`` would give it.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+
+    def __enter__(self):
+        (tmp_handle, self.tmp_filename) = _create_temporary_file(
+            self.filename)
+        self.fp = os.fdopen(tmp_handle, 'wb')
+
+        if os.path.exists(self.filename):
+            shutil.copymode(self.filename, self.tmp_filename)
+
+        return self.fp
+
+    def __exit__(self, t, value, traceback):
+        if t is None:
+            # Make sure the data is on disk before the file is renamed into
+            # place, so that a crash can't leave a partially written file
+            # behind
+            self.fp.flush()
+            os.fsync(self.fp.fileno())
+
+        self.fp.close()
+
+        if t is None:
+            # os.rename can't replace an existing file on Windows
+            getattr(os, 'replace', os.rename)(self.tmp_filename, self.filename)
+        else:
+            os.unlink(self.tmp_filename)
+
+def process_pool(workers):
+    """Create a pool of worker processes.
+
+    :param workers: the number of worker processes, or None for as many as
+      there are CPUs
+    :rtype: a ``concurrent.futures.ProcessPoolExecutor``
+    """
+    try:
+        from concurrent.futures import ProcessPoolExecutor
+    except ImportError:
+        raise ImportError("Using worker processes requires the "
+                          "concurrent.futures module (on Python 2, install "
+                          "the 'futures' package)")
+
+    return ProcessPoolExecutor(max_workers=workers)
+
 def fixed_width_string(string, width, fill=' '):
     return string[:width].ljust(fill)
@@ -0,0 +1,561 @@
+"""Views that read and write fields directly in a buffer of raw data.
+
+Parsing a song with bread means going through its bitstring representation
+one field at a time. The views in this module instead address each field by
+its offset in a ``bytearray`` holding the raw data, so that creating a view is
+free and reading or writing a field only touches the bytes that hold it.
+
+Views present the same interface as the structs and arrays that bread
+creates: struct fields are accessed as attributes (including the fields of
+whichever condition of a conditional is active), arrays are indexed like
+lists, and both support ``as_native()``. Field values are encoded and decoded
+with the functions that bread uses for the same spec, so they're identical to
+the values bread would produce.
+"""
+
+import json
+
+import bitstring
+import bread
+
+from . import bread_spec
+from .vendor.six.moves import range
+
+
+def _read_bits(data, offset, length):
+    start = offset // 8
+    stop = (offset + length + 7) // 8
+
+    value = 0
+
+    for byte in data[start:stop]:
+        value = (value << 8) | byte
+
+    shift = (stop - start) * 8 - (offset - start * 8) - length
+
+    return (value >> shift) & ((1 << length) - 1)
+
+
+def _write_bits(data, offset, length, value):
+    start = offset // 8
+    stop = (offset + length + 7) // 8
+
+    current = 0
+
+    for byte in data[start:stop]:
+        current = (current << 8) | byte
+
+    shift = (stop - start) * 8 - (offset - start * 8) - length
+    mask = ((1 << length) - 1) << shift
+
+    current = (current & ~mask) | ((value << shift) & mask)
+
+    for i in range(stop - 1, start - 1, -1):
+        data[i] = current & 0xff
+        current >>= 8
+
+
+class _DecodeError(object):
+    # Stands in for a value that bread can't decode, so that the error is
+    # raised when the value is read rather than when the table is built
+    def __init__(self, error):
+        self.error = error
+
+
+class _Leaf(object):
+
+    def __init__(self, field):
+        self.length = field._length
+        self._encode = field._encode_fn
+        self._decode = field._decode_fn
+
+        # Fields of a byte or less are decoded with a table covering every
+        # possible value. If the field's size divides a byte evenly, a second
+        # table maps each byte to the values of all the fields it holds.
+        self._decoded = None
+        self._byte_values = None
+
+        # Maps values to their encodings, for values that encode the same way
+        # every time; see _encode_table
+        self._encoded = None
+        self._encoded_types = None
+
+        # True if the field's value is just its bytes, as it is for strings
+        self._is_bytes = (self.length > 8 and self.length % 8 == 0 and
+                          self._decodes_to_bytes())
+
+    def _decodes_to_bytes(self):
+        probe = bytes(bytearray(range(1, self.length // 8 + 1)))
+
+        try:
+            return self._decode(bitstring.BitArray(bytes=probe)) == probe
+        except ValueError:
+            return False
+
+    def _decode_table(self):
+        decoded = []
+
+        for value in range(1 << self.length):
+            try:
+                decoded.append(self._decode(
+                    bitstring.BitArray(uint=value, length=self.length)))
+            except ValueError as e:
+                decoded.append(_DecodeError(e))
+
+        return decoded
+
+    def _build_decode_tables(self):
+        self._decoded = self._decode_table()
+
+        if 8 % self.length != 0 or any(
+                isinstance(value, _DecodeError) for value in self._decoded):
+            return
+
+        length = self.length
+        mask = (1 << length) - 1
+        shifts = range(8 - length, -1, -length)
+
+        self._byte_values = [
+            tuple(self._decoded[(byte >> shift) & mask] for shift in shifts)
+            for byte in range(0x100)]
+
+    def _encode_table(self):
+        # Only values that decode from exactly one encoding, and that bread
+        # encodes back to it, are put in the table; anything else is left to
+        # bread's encoder
+        if self._decoded is None:
+            self._build_decode_tables()
+
+        encodings = {}
+        duplicates = set()
+
+        for encoding, value in enumerate(self._decoded):
+            if isinstance(value, _DecodeError):
+                continue
+
+            try:
+                if value in encodings:
+                    duplicates.add(value)
+
+                encodings[value] = encoding
+            except TypeError:
+                # Unhashable
+                continue
+
+        encoded = {}
+
+        for value, encoding in encodings.items():
+            if value in duplicates:
+                continue
+
+            bits = self._encode(value)
+
+            if len(bits) == self.length and bits.uint == encoding:
+                encoded[value] = encoding
+
+        self._encoded_types = set(type(value) for value in encoded)
+        self._encoded = encoded
+
+    def get(self, data, offset):
+        length = self.length
+
+        if length > 8:
+            start = offset // 8
+            stop = (offset + length + 7) // 8
+
+            if self._is_bytes and offset % 8 == 0:
+                return bytes(data[start:stop])
+
+            bits = bitstring.BitArray(bytes=bytes(data[start:stop]))
+
+            leading_bits = offset - start * 8
+
+            return self._decode(bits[leading_bits:leading_bits + length])
+
+        if self._decoded is None:
+            self._build_decode_tables()
+
+        if length == 8 and offset % 8 == 0:
+            value = self._decoded[data[offset // 8]]
+        elif self._byte_values is not None and offset % length == 0:
+            value = self._byte_values[data[offset // 8]][
+                (offset % 8) // length]
+        else:
+            value = self._decoded[_read_bits(data, offset, length)]
+
+        if isinstance(value, _DecodeError):
+            raise value.error
+
+        return value
+
+    def get_all(self, data, offset, count):
+        """Decode ``count`` consecutive fields, the first at ``offset``."""
+        length = self.length
+
+        if length <= 8 and offset % 8 == 0 and (count * length) % 8 == 0:
+            if self._decoded is None:
+                self._build_decode_tables()
+
+            start = offset // 8
+            stop = start + count * length // 8
+
+            if length == 8 and self._byte_values is not None:
+                decoded = self._decoded
+                return [decoded[byte] for byte in data[start:stop]]
+            elif self._byte_values is not None:
+                byte_values = self._byte_values
+                return [value for byte in data[start:stop]
+                        for value in byte_values[byte]]
+
+        return [self.get(data, offset + i * length) for i in range(count)]
+
+    def set(self, data, offset, value):
+        if self.length <= 8:
+            if self._encoded is None:
+                self._encode_table()
+
+            if (type(value) in self._encoded_types and
+                    value in self._encoded):
+                encoding = self._encoded[value]
+
+                if self.length == 8 and offset % 8 == 0:
+                    data[offset // 8] = encoding
+                else:
+                    _write_bits(data, offset, self.length, encoding)
+
+                return
+
+        try:
+            bits = self._encode(value)
+        except bitstring.CreationError as e:
+            raise ValueError(str(e))
+
+        # Like bread, write as many bits as the encoded value has
+        if len(bits) == 0:
+            return
+
+        if offset % 8 == 0 and len(bits) % 8 == 0:
+            start = offset // 8
+            data[start:start + len(bits) // 8] = bits.bytes
+        else:
+            _write_bits(data, offset, len(bits), bits.uint)
+
+
+class _Array(object):
+
+    def __init__(self, num_items, item):
+        self.num_items = num_items
+        self.item = item
+        self.length = num_items * item.length
+
+    def get(self, data, offset):
+        return ArrayView(data, offset, self)
+
+    def get_all(self, data, offset):
+        """Get every item in the array."""
+        item = self.item
+
+        if isinstance(item, _Leaf):
+            return item.get_all(data, offset, self.num_items)
+
+        return [item.get(data, offset + i * item.length)
+                for i in range(self.num_items)]
+
+    def set(self, data, offset, value):
+        if not isinstance(value, (list, tuple, ArrayView)):
+            raise ValueError('Cannot set an array using a %s value' %
+                             (str(type(value))))
+
+        if len(value) != self.num_items:
+            raise ValueError(
+                'Cannot change the length of an array '
+                '(would have changed from %d to %d)'
+                % (self.num_items, len(value)))
+
+        for i, item in enumerate(value):
+            self.item.set(data, offset + i * self.item.length, item)
+
+
+class _Struct(object):
+
+    def __init__(self, length):
+        self.length = length
+
+        # Maps each field's name to its offset within the struct and its type
+        self.fields = {}
+
+        # (offset, predicate field name, {condition: _Struct}) tuples
+        self.conditionals = []
+
+        # Field names, or conditionals, in the order that they appear
+        self.field_order = []
+
+    def get(self, data, offset):
+        return StructView(data, offset, self)
+
+    def set(self, data, offset, value):
+        raise ValueError("Can't set a non-leaf struct to a value")
+
+
+def _compile(field):
+    if isinstance(field, bread.BreadArray):
+        return _Array(field._num_items, _compile(field._get_accessor_item(0)))
+    elif isinstance(field, bread.BreadStruct):
+        struct = _Struct(field._length)
+
+        for subfield in field._field_list:
+            offset = subfield._offset - field._offset
+
+            if isinstance(subfield, bread.BreadConditional):
+                conditional = (
+                    offset, subfield._conditional_field_name,
+                    dict((condition, _compile(condition_struct))
+                         for condition, condition_struct
+                         in subfield._conditions.items()))
+
+                struct.conditionals.append(conditional)
+                struct.field_order.append(conditional)
+            elif subfield._name[0] != '_':
+                # Unnamed fields are padding
+                struct.fields[subfield._name] = (offset, _compile(subfield))
+                struct.field_order.append(subfield._name)
+
+        return struct
+    else:
+        return _Leaf(field)
+
+
+def compile_spec(spec):
+    """Work out how to find and decode each field of a spec, so that views of
+    raw data in that format can be created.
+
+    :param spec: a bread spec
+    :rtype: an opaque object to pass to :py:class:`StructView`
+    """
+    return _compile(bread.new(spec))
+
+
+class ArrayView(object):
+
+    """An array of fields in a buffer of raw data."""
+
+    __slots__ = ('_data', '_offset', '_array')
+
+    def __init__(self, data, offset, array):
+        self._data = data
+        self._offset = offset
+        self._array = array
+
+    def __len__(self):
+        return self._array.num_items
+
+    def __getitem__(self, index):
+        array = self._array
+        item = array.item
+
+        if type(index) is slice:
+            return array.get_all(self._data, self._offset)[index]
+
+        if index < 0 or index >= array.num_items:
+            raise IndexError('list index out of range')
+
+        return item.get(self._data, self._offset + index * item.length)
+
+    def __setitem__(self, index, value):
+        array = self._array
+
+        if index < 0 or index >= array.num_items:
+            raise IndexError('list index out of range')
+
+        array.item.set(
+            self._data, self._offset + index * array.item.length, value)
+
+    def __iter__(self):
+        return iter(self._array.get_all(self._data, self._offset))
+
+    def __eq__(self, other):
+        if isinstance(other, (list, ArrayView)):
+            return list(self) == list(other)
+
+        return False
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def as_native(self):
+        items = self._array.get_all(self._data, self._offset)
+
+        if isinstance(self._array.item, _Leaf):
+            return items
+
+        return [item.as_native() for item in items]
+
+    def __str__(self):
+        return '[' + ', '.join(str(item) for item in self) + ']'
+
+
+class StructView(object):
+
+    """A struct in a buffer of raw data, whose fields are accessed as
+    attributes."""
+
+    __slots__ = ('_data', '_offset', '_struct')
+
+    def __init__(self, data, offset, struct):
+        self._data = data
+        self._offset = offset
+        self._struct = struct
+
+    def _active_condition(self, conditional):
+        offset, predicate_field_name, conditions = conditional
+
+        condition = getattr(self, predicate_field_name)
+
+        if condition not in conditions:
+            raise bread.BadConditionalCaseError(str(condition))
+
+        return StructView(
+            self._data, self._offset + offset, conditions[condition])
+
+    def __getattr__(self, attr):
+        struct = self._struct
+
+        if attr in struct.fields:
+            offset, field = struct.fields[attr]
+            return field.get(self._data, self._offset + offset)
+
+        for conditional in struct.conditionals:
+            try:
+                return getattr(self._active_condition(conditional), attr)
+            except AttributeError:
+                pass
+
+        raise AttributeError("No known field '%s'" % (attr))
+
+    def __setattr__(self, attr, value):
+        if attr[0] == '_':
+            super(StructView, self).__setattr__(attr, value)
+            return
+
+        struct = self._struct
+
+        if attr in struct.fields:
+            offset, field = struct.fields[attr]
+            field.set(self._data, self._offset + offset, value)
+            return
+
+        for conditional in struct.conditionals:
+            try:
+                return setattr(self._active_condition(conditional), attr,
+                               value)
+            except AttributeError:
+                pass
+
+        raise AttributeError("No known field '%s'" % (attr))
+
+    def __len__(self):
+        return self._struct.length
+
+    def _bits(self):
+        length = self._struct.length
+
+        if self._offset % 8 == 0 and length % 8 == 0:
+            start = self._offset // 8
+            return bytes(self._data[start:start + length // 8])
+
+        return _read_bits(self._data, self._offset, length)
+
+    def __eq__(self, other):
+        return (isinstance(other, StructView) and
+                self._struct is other._struct and
+                self._bits() == other._bits())
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def as_native(self):
+        native_struct = {}
+
+        for field in self._struct.field_order:
+            if type(field) == tuple:
+                native_struct.update(
+                    self._active_condition(field).as_native())
+            else:
+                value = getattr(self, field)
+
+                if hasattr(value, 'as_native'):
+                    value = value.as_native()
+
+                native_struct[field] = value
+
+        return native_struct
+
+    def as_json(self):
+        return json.dumps(self.as_native())
+
+    def __str__(self):
+        return str(self.as_native())
+
+
+_SONG = compile_spec(bread_spec.song)
+
+
+def song_field(raw_data, start, name):
+    """Read a top-level field of a song from part of the song's raw data.
+
+    :param raw_data: a ``bytearray`` holding part of the song's raw data
+    :param start: the offset in bytes within the song at which ``raw_data``
+      starts
+    :param name: the field's name
+    :rtype: the field's value
+    """
+    return getattr(StructView(raw_data, -start * 8, _SONG), name)
+
+
+class SongData(StructView):
+
+    """A view of a song's raw data, with the fields described by
+    ``bread_spec.song``.
+
+    Changes made through the view are made to the raw data itself.
+    """
+
+    __slots__ = ('_field_views',)
+
+    def __init__(self, raw_data):
+        """Constructor.
+
+        :param raw_data: the song's raw (decompressed) data. If it's a
+          ``bytearray``, the view refers to it directly rather than copying it.
+        """
+        if not isinstance(raw_data, bytearray):
+            raw_data = bytearray(raw_data)
+
+        super(SongData, self).__init__(raw_data, 0, _SONG)
+
+        # Views of the song's arrays and structs, created the first time
+        # each one is accessed. Views read through to the raw data, so they
+        # never go stale.
+        self._field_views = {}
+
+    def __getattr__(self, attr):
+        if attr[0] == '_':
+            # Only reached for private attributes that haven't been set yet
+            raise AttributeError(attr)
+
+        field_views = self._field_views
+
+        if attr in field_views:
+            return field_views[attr]
+
+        value = super(SongData, self).__getattr__(attr)
+
+        if isinstance(value, (ArrayView, StructView)):
+            field_views[attr] = value
+
+        return value
+
+    @property
+    def raw_data(self):
+        """the ``bytearray`` that the view refers to"""
+        return self._data
@@ -20,5 +20,6 @@ setup(name='pylsdj',
       license='MIT',
       packages=['pylsdj', 'pylsdj.vendor'],
       requires=['bread'],
-      install_requires=['bread>=2.1.0'],
+      install_requires=['bread>=2.2.0,<2.3', 'futures; python_version < "3"'],
+      extras_require={'arrays': ['numpy']},
       zip_safe=False)